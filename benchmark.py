@@ -0,0 +1,508 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2023 le-firehawk
+
+# remote-media-controller is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# remote-media-controller is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# To contact the owner of remote-media-controller, use the following:
+# Email: firehawk@opayq.net
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/agpl-3.0.html>
+
+## Benchmarks the controller's command and metadata paths against a local fake
+## media host: a paramiko SSH/SFTP server whose playerctl, pactl and magick are
+## stub scripts, and a fake cmus server. Both sit behind a proxy which delays
+## every packet, modelling the link to a real media box.
+
+import sys, os, json, time, socket, threading, tempfile, subprocess, shutil, struct, zlib, getpass, queue
+import paramiko
+import main
+
+SSH_PASSWORD, CMUS_PASSWORD = "benchmark", "benchmark"
+
+## Size of the PNG the magick stub answers with, typical of a 384x384 cover thumbnail
+THUMBNAIL_BYTES = 48 * 1024
+
+## Each actions is run through controller.__executeOperations__, as the dispatcher would
+ACTIONS = [("refresh", None), ("play_pause", None), ("next", 1), ("seek", 5), ("position", 60), ("volume", 40)]
+
+STUB_PLAYERCTL = r'''#!/usr/bin/env python3
+import json, os, re, sys
+path, args = os.environ["RMC_BENCH_STATE"], sys.argv[1:]
+with open(path) as state_file:
+    state = json.load(state_file)
+if args[0] == "status":
+    print(state["status"])
+elif args[0] == "metadata":
+    template = args[args.index("--format") + 1]
+    fields = dict(state["metadata"], position=int(state["position"] * 1000000))
+    print(re.sub(r"{{\s*([^}]+?)\s*}}", lambda match: str(fields.get(match.group(1), "")), template))
+elif args[0] == "loop" and len(args) == 1:
+    print(state["loop"])
+elif args[0] == "shuffle" and len(args) == 1:
+    print("On" if state["shuffle"] else "Off")
+else:
+    if args[0] == "loop":
+        state["loop"] = args[1]
+    elif args[0] == "shuffle":
+        state["shuffle"] = not state["shuffle"]
+    elif args[0] == "play-pause":
+        state["status"] = "Paused" if state["status"] == "Playing" else "Playing"
+    elif args[0] == "pause":
+        state["status"] = "Paused"
+    elif args[0] in ["next", "previous"]:
+        state["track"] += 1 if args[0] == "next" else -1
+        state["metadata"]["xesam:title"], state["position"] = f"Track {state['track']}", 0
+    elif args[0] == "position":
+        offset = float(args[1].rstrip("+-"))
+        state["position"] = max(state["position"] + (offset if args[1].endswith("+") else -offset if args[1].endswith("-") else offset - state["position"]), 0)
+    with open(path, "w") as state_file:
+        json.dump(state, state_file)
+'''
+
+STUB_PACTL = r'''#!/usr/bin/env python3
+import json, os, sys
+path, args = os.environ["RMC_BENCH_STATE"], sys.argv[1:]
+with open(path) as state_file:
+    state = json.load(state_file)
+if args[0] == "get-sink-volume":
+    print(f"Volume: front-left: 65536 / {state['volume']}% / 0.00 dB,   front-right: 65536 / {state['volume']}% / 0.00 dB")
+elif args[0] == "set-sink-volume":
+    state["volume"] = int(args[2].rstrip("%"))
+    with open(path, "w") as state_file:
+        json.dump(state, state_file)
+'''
+
+## Stands in for ImageMagick, only on the PATH while remote thumbnails are enabled;
+## answers with a THUMBNAIL_SIZE PNG of THUMBNAIL_BYTES
+STUB_MAGICK = '''#!/bin/sh
+exec cat "$RMC_BENCH_THUMBNAIL_FILE"
+'''
+
+def write_png(path, target_bytes, size=None):
+    ## Random RGB pixels barely compress, so the file ends up close to target_bytes; with a size,
+    ## rows past target_bytes are left black, which compresses to almost nothing
+    width, height = size or (max(int((target_bytes / 3) ** 0.5), 1),) * 2
+    noisy = min(max(target_bytes // (width * 3), 1), height)
+    raw = b"".join(b"\x00" + (os.urandom(width * 3) if row < noisy else bytes(width * 3)) for row in range(height))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    with open(path, "wb") as image_file:
+        image_file.write(main.PNG_SIGNATURE + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+class latencyProxy:
+    def __init__(self, backend_port, latency, bandwidth=None):
+        ## Forwards 127.0.0.1:<port> to the backend, delaying each direction by half the RTT
+        ## and optionally limiting throughput (bytes per second)
+        self.__backend_port__, self.__delay__, self.__bandwidth__ = backend_port, latency / 2, bandwidth
+        self.__listener__ = socket.create_server(("127.0.0.1", 0))
+        self.port = self.__listener__.getsockname()[1]
+        threading.Thread(target=self.__accept__, daemon=True).start()
+
+    def __accept__(self):
+        while True:
+            try:
+                client, _ = self.__listener__.accept()
+            except OSError:
+                return
+            backend = socket.create_connection(("127.0.0.1", self.__backend_port__))
+            for source, destination in [(client, backend), (backend, client)]:
+                packets = queue.Queue()
+                threading.Thread(target=self.__read__, args=(source, packets), daemon=True).start()
+                threading.Thread(target=self.__write__, args=(destination, packets), daemon=True).start()
+
+    def __read__(self, source, packets):
+        while True:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b""
+            packets.put((time.monotonic() + self.__delay__, data))
+            if not data:
+                return
+
+    def __write__(self, destination, packets):
+        while True:
+            due, data = packets.get()
+            time.sleep(max(due - time.monotonic(), 0))
+            try:
+                if not data:
+                    destination.shutdown(socket.SHUT_WR)
+                    return
+                if self.__bandwidth__:
+                    time.sleep(len(data) / self.__bandwidth__)
+                destination.sendall(data)
+            except OSError:
+                return
+
+    def close(self):
+        self.__listener__.close()
+
+class fakeSSHServer(paramiko.ServerInterface):
+    def __init__(self, host):
+        self.host = host
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if password == SSH_PASSWORD else paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.host.execute, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+class stubSFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+class stubSFTPServer(paramiko.SFTPServerInterface):
+    ## Serves the local filesystem, counting requests which cost a round trip
+    def __init__(self, server, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.__host__ = server.host
+
+    def stat(self, path):
+        self.__host__.count("sftp_requests")
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        self.__host__.count("sftp_requests")
+        try:
+            handle = stubSFTPHandle(flags)
+            handle.readfile = handle.writefile = os.fdopen(os.open(path, flags, 0o644), "r+b" if flags & os.O_RDWR else "wb" if flags & os.O_WRONLY else "rb")
+            return handle
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(path)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+class fakeMediaHost:
+    def __init__(self, **kwargs):
+        self.latency = kwargs.get("latency", 0.02)
+        self.remote_thumbnail = True
+        self.counters, self.__lock__ = {"round_trips": 0, "sftp_requests": 0}, threading.Lock()
+        self.directory = tempfile.mkdtemp(prefix="rmc-benchmark-")
+
+        ## Stub commands and their shared player state
+        stubs, self.__thumbnailers__ = os.path.join(self.directory, "bin"), os.path.join(self.directory, "magick-bin")
+        for directory, name, script in [(stubs, "playerctl", STUB_PLAYERCTL), (stubs, "pactl", STUB_PACTL),
+                (self.__thumbnailers__, "magick", STUB_MAGICK), (self.__thumbnailers__, "convert", STUB_MAGICK)]:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, name), "w") as stub_file:
+                stub_file.write(script)
+            os.chmod(os.path.join(directory, name), 0o755)
+        self.__state__ = os.path.join(self.directory, "state.json")
+        self.art = [os.path.join(self.directory, f"cover-{index}.png") for index in range(kwargs.get("art_count", 5))]
+        for path in self.art:
+            write_png(path, kwargs.get("art_size", 512 * 1024))
+        thumbnail = os.path.join(self.directory, "thumbnail.png")
+        write_png(thumbnail, THUMBNAIL_BYTES, main.THUMBNAIL_SIZE)
+        with open(self.__state__, "w") as state_file:
+            json.dump({"status": "Playing", "loop": "Playlist", "shuffle": False, "volume": 50, "track": 1, "position": 0, "metadata": {
+                "xesam:title": "Track 1", "xesam:artist": "Benchmark Artist", "xesam:album": "Benchmark Album", "mpris:artUrl": "", "mpris:length": 240000000
+            }}, state_file)
+        self.__environment__ = dict(os.environ, PATH=f"{stubs}:{os.environ.get('PATH', '/usr/bin:/bin')}", RMC_BENCH_STATE=self.__state__,
+            RMC_BENCH_THUMBNAIL_FILE=thumbnail)
+
+        self.__host_key__ = paramiko.RSAKey.generate(2048)
+        self.__ssh_listener__ = socket.create_server(("127.0.0.1", 0))
+        self.__cmus_listener__ = socket.create_server(("127.0.0.1", 0))
+        self.__cmus_state__ = {"status": "playing", "track": 1, "position": 0, "vol": 50, "shuffle": "false", "repeat": "true", "repeat_current": "false"}
+        threading.Thread(target=self.__acceptSSH__, daemon=True).start()
+        threading.Thread(target=self.__acceptCmus__, daemon=True).start()
+
+        ## Clients connect through the proxies, never to the servers directly
+        self.ssh_proxy = latencyProxy(self.__ssh_listener__.getsockname()[1], self.latency, kwargs.get("bandwidth", None))
+        self.cmus_proxy = latencyProxy(self.__cmus_listener__.getsockname()[1], self.latency, kwargs.get("bandwidth", None))
+
+    def count(self, counter):
+        with self.__lock__:
+            self.counters[counter] += 1
+
+    def snapshot(self):
+        with self.__lock__:
+            return dict(self.counters)
+
+    def set_art(self, path):
+        with open(self.__state__) as state_file:
+            state = json.load(state_file)
+        state["metadata"]["mpris:artUrl"] = f"file://{path}" if path else ""
+        with open(self.__state__, "w") as state_file:
+            json.dump(state, state_file)
+
+    def execute(self, channel, command):
+        self.count("round_trips")
+        ## Without remote thumbnails the host looks as if ImageMagick were not installed
+        ## (unless the machine running the benchmark has it installed itself)
+        environment = dict(self.__environment__)
+        if self.remote_thumbnail:
+            environment["PATH"] = f"{self.__thumbnailers__}:{environment['PATH']}"
+        result = subprocess.run(["sh", "-c", command], capture_output=True, env=environment)
+        channel.sendall(result.stdout)
+        channel.sendall_stderr(result.stderr)
+        channel.send_exit_status(result.returncode)
+        channel.close()
+
+    def __acceptSSH__(self):
+        while True:
+            try:
+                client, _ = self.__ssh_listener__.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.__host_key__)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer, stubSFTPServer)
+            transport.start_server(server=fakeSSHServer(self))
+
+    def __acceptCmus__(self):
+        while True:
+            try:
+                client, _ = self.__cmus_listener__.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.__serveCmus__, args=(client,), daemon=True).start()
+
+    def __serveCmus__(self, client):
+        ## Same framing as cmus' server: passwd first, each reply terminated by an empty line
+        stream = client.makefile("rb")
+        if stream.readline().decode().strip() != f"passwd {CMUS_PASSWORD}":
+            client.sendall(b"authentication failed\n")
+            client.close()
+            return
+        client.sendall(b"\n")
+        for line in stream:
+            self.count("round_trips")
+            command, _, argument = line.decode().strip().partition(" ")
+            state = self.__cmus_state__
+            if command == "status":
+                reply = (f"status {state['status']}\nfile {self.directory}/track-{state['track']}.flac\nduration 240\n"
+                    f"position {state['position']}\ntag artist Benchmark Artist\ntag album Benchmark Album\n"
+                    f"tag title Track {state['track']}\nset repeat {state['repeat']}\nset repeat_current {state['repeat_current']}\n"
+                    f"set shuffle {state['shuffle']}\nset vol_left {state['vol']}\nset vol_right {state['vol']}\n")
+            else:
+                if command == "player-pause":
+                    state["status"] = "paused" if state["status"] == "playing" else "playing"
+                elif command == "player-pause-playback":
+                    state["status"] = "paused"
+                elif command in ["player-next", "player-prev"]:
+                    state["track"] += 1 if command == "player-next" else -1
+                elif command == "seek":
+                    state["position"] = max(state["position"] + int(argument), 0)
+                elif command == "vol":
+                    state["vol"] = int(argument.rstrip("%"))
+                elif command == "toggle" and argument == "shuffle":
+                    state["shuffle"] = "false" if state["shuffle"] == "true" else "true"
+                elif command == "set":
+                    setting, _, value = argument.partition("=")
+                    state[setting] = value
+                reply = ""
+            client.sendall(f"{reply}\n".encode())
+
+    def close(self):
+        self.ssh_proxy.close()
+        self.cmus_proxy.close()
+        self.__ssh_listener__.close()
+        self.__cmus_listener__.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)] if values else 0
+
+def measure(host, function, iterations):
+    ## Returns latency percentiles (ms) and remote requests per call
+    durations, before = [], host.snapshot()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started) * 1000)
+    after = host.snapshot()
+    return {
+        "p50_ms": round(percentile(durations, 0.5), 2),
+        "p95_ms": round(percentile(durations, 0.95), 2),
+        "round_trips": round((after["round_trips"] - before["round_trips"]) / iterations, 2),
+        "sftp_requests": round((after["sftp_requests"] - before["sftp_requests"]) / iterations, 2)
+    }
+
+def start_controller(mode, host, cache_dir, version, **kwargs):
+    parameters = {
+        "mode": mode, "remoteHost": "127.0.0.1", "remoteUser": getpass.getuser(), "password": CMUS_PASSWORD,
+        "remotePort": host.ssh_proxy.port if mode == "ssh" else host.cmus_proxy.port,
+        "headless": True, "ssh_passphrase": SSH_PASSWORD, "cache_dir": cache_dir
+    }
+    parameters.update(kwargs)
+    return main.controller(parameters, version)
+
+def benchmark_mode(mode, host, config, version, **kwargs):
+    results, cache_dir = {}, tempfile.mkdtemp(prefix="rmc-benchmark-cache-")
+    host.set_art(None)
+    started = time.perf_counter()
+    instance = start_controller(mode, host, cache_dir, version, **kwargs)
+    results["startup_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    try:
+        for operation, value in ACTIONS:
+            results[operation] = measure(host, lambda: instance.__executeOperations__([(operation, value)]), config["iterations"])
+
+        ## Rapid input: every press goes through the coalescing dispatcher
+        acknowledged, before = threading.Event(), host.snapshot()
+        presses = [("seek", 5)] * 20 + [("volume", level) for level in range(20, 60, 2)] + [("next", 1)] * 10
+        dispatcher = main.commandDispatcher(instance.__executeOperations__, lambda operations, result: dispatcher.idle() and acknowledged.set())
+        started = time.perf_counter()
+        for operation, value in presses:
+            dispatcher.submit(operation, value)
+        acknowledged.wait(60)
+        elapsed = time.perf_counter() - started
+        dispatcher.stop()
+        results["rapid_sequence"] = {
+            "presses": len(presses),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "presses_per_second": round(len(presses) / elapsed, 2),
+            "round_trips": host.snapshot()["round_trips"] - before["round_trips"]
+        }
+
+        if mode == "ssh":
+            for scenario, remote_thumbnail in [("art_remote_thumbnail", True), ("art_sftp", False)]:
+                host.remote_thumbnail = remote_thumbnail
+                ## Each scenario starts out not knowing whether the host has ImageMagick
+                instance.__connection__["thumbnailer"] = None
+                ## A fresh cache directory makes every first fetch a miss
+                instance.__artCache__ = main.artCache(tempfile.mkdtemp(dir=cache_dir), 64 * 1024 * 1024)
+                art = iter(host.art)
+                results[f"{scenario}_miss"] = measure(host, lambda: instance.__fetchArtwork__(f"file://{next(art)}"), len(host.art))
+                results[f"{scenario}_hit"] = measure(host, lambda: instance.__fetchArtwork__(f"file://{host.art[0]}"), config["iterations"])
+            host.remote_thumbnail = True
+    finally:
+        instance.__shutdown__()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+def flatten(results, prefix=""):
+    ## {"ssh": {"next": {"p50_ms": 1}}} -> {"ssh.next.p50_ms": 1}
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def report(results, baseline=None):
+    current, previous = flatten(results), flatten(baseline or {})
+    for key, value in current.items():
+        if key in previous and isinstance(value, (int, float)) and previous[key]:
+            change = (value - previous[key]) / previous[key] * 100
+            print(f"{key:<48}{value:>12}{previous[key]:>12}{change:>+9.1f}%")
+        else:
+            print(f"{key:<48}{str(value):>12}")
+
+def report_links(results):
+    ## Fastest profile for metadata-only traffic and for bulk (untouched) artwork transfer
+    links = {key: value for key, value in results.items() if key.startswith("ssh/")}
+    for label, metric in [("metadata (refresh p50)", "refresh"), ("bulk art transfer (p50)", "art_sftp_miss")]:
+        timings = {key.split("/")[1]: value[metric]["p50_ms"] for key, value in links.items() if metric in value}
+        if len(timings) > 1:
+            winner = min(timings, key=timings.get)
+            print(f"Fastest link profile for {label}: {winner} ({', '.join(f'{link} {timing} ms' for link, timing in timings.items())})")
+
+def load_params(vals):
+    parameters = {"latency": 20, "art_size": 512, "art_count": 5, "iterations": 20, "modes": ["ssh", "cmus"], "links": ["lan"], "bandwidth": None}
+    vals = iter(vals[1:])
+    for val in vals:
+        ## Artificial round trip time added by the proxy, in ms
+        if val == "--latency":
+            parameters["latency"] = float(next(vals))
+        ## Size of each cover image, in KB
+        elif val == "--art-size":
+            parameters["art_size"] = int(next(vals))
+        elif val == "--art-count":
+            parameters["art_count"] = int(next(vals))
+        ## Link throughput limit, in KB/s
+        elif val == "--bandwidth":
+            parameters["bandwidth"] = int(next(vals))
+        elif val == "--iterations":
+            parameters["iterations"] = int(next(vals))
+        elif val == "--modes":
+            parameters["modes"] = next(vals).split(",")
+        ## SSH transport profiles to compare, see TRANSPORT_PROFILES in main.py
+        elif val == "--links":
+            parameters["links"] = next(vals).split(",")
+        ## Store results, or compare against results stored earlier
+        elif val == "--save-baseline":
+            parameters["save_baseline"] = next(vals)
+        elif val == "--compare":
+            parameters["compare"] = next(vals)
+        else:
+            usage()
+            exit(1)
+    return parameters
+
+def usage():
+    print("Usage:")
+    print(f"    {sys.argv[0]} [<option>...]")
+    print("Options:")
+    print(f"    --latency       [round trip ms, e.g. 20]")
+    print(f"    --bandwidth     [KB/s, e.g. 1024]")
+    print(f"    --art-size      [KB per cover, e.g. 512]")
+    print(f"    --art-count     [e.g. 5]")
+    print(f"    --iterations    [e.g. 20]")
+    print(f"    --modes         [e.g. ssh,cmus]")
+    print(f"    --links         [e.g. lan,wan,lowpower]")
+    print(f"    --save-baseline [e.g. benchmark-baseline.json]")
+    print(f"    --compare       [e.g. benchmark-baseline.json]")
+
+def main_benchmark():
+    config = load_params(sys.argv)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "version.txt")) as version_file:
+        version = version_file.read()
+    main.load_modules(gui=False)
+
+    host = fakeMediaHost(latency=config["latency"] / 1000, art_size=config["art_size"] * 1024, art_count=config["art_count"],
+        bandwidth=config["bandwidth"] * 1024 if config["bandwidth"] else None)
+    try:
+        results = {"config": {key: config[key] for key in ["latency", "bandwidth", "art_size", "art_count", "iterations", "links"]}}
+        for mode in config["modes"]:
+            ## Link profiles only tune SSH, so cmus is measured once
+            for link in config["links"] if mode != "cmus" else [None]:
+                results[f"{mode}/{link}" if link else mode] = benchmark_mode(mode, host, config, version, **({"link": link} if link else {}))
+    finally:
+        host.close()
+
+    baseline = None
+    if config.get("compare"):
+        with open(config["compare"]) as baseline_file:
+            baseline = json.load(baseline_file)
+    report(results, baseline)
+    report_links(results)
+    if config.get("save_baseline"):
+        with open(config["save_baseline"], "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+
+if __name__ == "__main__":
+    main_benchmark()
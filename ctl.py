@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2023 le-firehawk
+
+# remote-media-controller is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# remote-media-controller is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# To contact the owner of remote-media-controller, use the following:
+# Email: firehawk@opayq.net
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/agpl-3.0.html>
+
+## Client for a running --daemon, kept apart from main.py so hotkeys and scripts
+## only pay for the standard library modules used here
+
+import sys, os, json, socket
+
+## Commands understood by the daemon, with the aliases ctl accepts for them
+CTL_COMMANDS = ["status", "play_pause", "pause", "next", "previous", "seek", "volume", "shuffle_toggle", "loop", "quit"]
+CTL_ALIASES = {"play-pause": "play_pause", "toggle": "play_pause", "prev": "previous", "shuffle": "shuffle_toggle", "repeat": "loop"}
+
+def ctl(vals):
+    ## Thin client for a running --daemon; sends one request and prints the reply
+    socket_path, request, as_json, words = default_socket_path(), {}, False, []
+    vals = iter(vals)
+    for val in vals:
+        if val in ["--socket", "-s"]:
+            socket_path = next(vals, socket_path)
+        elif val == "--json":
+            as_json = True
+        elif val == "--all":
+            request["all"] = True
+        else:
+            words.append(val)
+    if not words or CTL_ALIASES.get(words[0], words[0]) not in CTL_COMMANDS:
+        usage()
+        return 1
+    request["command"] = CTL_ALIASES.get(words[0], words[0])
+    request["value"] = words[1] if len(words) > 1 else None
+
+    try:
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(socket_path)
+            client.sendall((json.dumps(request) + "\n").encode())
+            response = json.loads(client.makefile("r").readline())
+    except (OSError, ValueError):
+        print(f"No daemon listening on {socket_path}. Is remote-media-controller --daemon running?")
+        return 1
+
+    if not response.get("ok"):
+        print(response.get("error", "Unknown error"))
+        return 1
+    if as_json:
+        print(json.dumps(response.get("state")))
+    elif request["command"] == "status":
+        state = response["state"]
+        print(f"{(state['status'] or 'stopped').capitalize()}: {state['title'] or 'Unknown Track'} - {state['artist'] or 'Unknown Artist'} ({state['album'] or 'Unknown Album'})")
+        print(f"Volume: {state['volume']}%  Repeat: {state['loop']}  Shuffle: {'On' if state['shuffle'] else 'Off'}")
+    return 0
+
+def default_socket_path():
+    ## XDG_RUNTIME_DIR is private to the user, unlike /tmp
+    ## (TMPDIR is read directly, as importing tempfile alone would double ctl's import time)
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR", os.environ.get("TMPDIR", "/tmp")), "remote-media-controller.sock")
+
+def usage():
+    print("Usage:")
+    ## Run either as main.py ctl, or as ctl.py directly
+    command = sys.argv[0] if os.path.basename(sys.argv[0]) == "ctl.py" else f"{sys.argv[0]} ctl"
+    print(f"    {command} [--socket <path>] [--all] [--json] <command> [<value>]")
+    print(f"    commands: {', '.join(CTL_COMMANDS)}")
+
+if __name__ == "__main__":
+    exit(ctl(sys.argv[1:]))
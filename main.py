@@ -18,21 +18,617 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/agpl-3.0.html>
 
-import PySimpleGUI as gui
-import subprocess, re, sys, os, hashlib
-from paramiko import SSHClient, AutoAddPolicy
+import sys
+## The ctl client is dispatched before anything else is imported, see ctl.py
+if __name__ == "__main__" and sys.argv[1:2] == ["ctl"]:
+    from ctl import ctl
+    exit(ctl(sys.argv[2:]))
 
-# TODO: Read theme from file
-gui.theme("black")
+import time
+## Reference point for --profile-startup
+STARTUP_TIME = time.perf_counter()
+
+import re, os, hashlib, threading, json, socket, socketserver, getpass, math, ipaddress, queue, shutil
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from collections import OrderedDict, deque
+from array import array
+from urllib.parse import unquote, urlparse
+from shlex import quote
+from dataclasses import dataclass, asdict
+from typing import Optional
+from ctl import CTL_COMMANDS, default_socket_path
+
+## GUI, SSH and imaging modules are only imported by load_modules(), keeping
+## "main.py ctl" down to the standard library
+gui, SSHClient, AutoAddPolicy, SSHException, Transport, SFTPClient, private_key_types, pillow = None, None, None, None, None, None, (), None
+## Exceptions which mean the link to a host was lost (SSHException is added once paramiko is loaded)
+connection_errors = (OSError, EOFError)
+## Exceptions which mean a piece of artwork cannot be shown (Pillow's are added once it is loaded)
+artwork_errors = (OSError, ValueError)
+
+def load_modules(**kwargs):
+    ## The window only needs PySimpleGUI, SSH and imaging modules can follow in the background
+    global gui, SSHClient, AutoAddPolicy, SSHException, Transport, SFTPClient, private_key_types, connection_errors, artwork_errors, pillow
+    if kwargs.get("gui", True):
+        import PySimpleGUI as gui
+        # TODO: Read theme from file
+        gui.theme("black")
+    if not kwargs.get("ssh", True):
+        return
+    import paramiko
+    from paramiko import SSHClient, AutoAddPolicy, SSHException, Transport, SFTPClient, RSAKey, ECDSAKey, Ed25519Key
+    ## DSA keys are only supported by paramiko releases before 4.0
+    private_key_types = tuple(key_type for key_type in (RSAKey, ECDSAKey, Ed25519Key, getattr(paramiko, "DSSKey", None)) if key_type)
+    connection_errors = (OSError, EOFError, SSHException)
+
+    ## Pillow is optional, used to downscale artwork the remote host could not
+    try:
+        from PIL import Image as pillow
+        ## Artwork comes from the remote host, so oversized images are refused rather than decoded
+        pillow.MAX_IMAGE_PIXELS = ARTWORK_MAX_PIXELS
+        artwork_errors = (OSError, ValueError, pillow.DecompressionBombError)
+    except ImportError:
+        pillow = None
+
+## Artwork is displayed, and therefore cached, at this size
+THUMBNAIL_SIZE = (384, 384)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+## Largest artwork Pillow decodes locally, far above any real cover
+ARTWORK_MAX_PIXELS = 8192 * 8192
+## Image modes PNG can store as they are; anything else (such as CMYK JPEGs) is converted first
+PNG_MODES = ["1", "L", "LA", "I", "I;16", "P", "RGB", "RGBA"]
+
+## Control characters delimit fetched fields, as no tag can contain them
+FIELD_SEPARATOR, RECORD_SEPARATOR = "\x1f", "\x1e"
+
+## playerctl template producing one record per track field
+TRACK_FORMAT = RECORD_SEPARATOR.join(f"{field}{FIELD_SEPARATOR}{{{{{tag}}}}}" for field, tag in [
+    ("title", "xesam:title"), ("artist", "xesam:artist"), ("album", "xesam:album"), ("art_url", "mpris:artUrl"),
+    ("length", "mpris:length"), ("position", "position")
+]) + RECORD_SEPARATOR
+
+## Seconds between position fetches while playing, correcting interpolation drift
+DRIFT_CHECK_INTERVAL = 30
+
+## Rows of the library browser which exist as widgets, and tracks indexed per streamed chunk
+BROWSER_ROWS, LIBRARY_CHUNK = 12, 1000
+
+## Decoded artwork kept in memory by the window
+IMAGE_CACHE_SIZE = 16
+
+## Seconds after which a temporary artwork file is taken to be left over from an interrupted
+## transfer; younger ones may belong to another process (a daemon and a window) sharing the cache
+STALE_PART_AGE = 600
+
+## Seconds before a remote command times out; liveness probes are timed by the link profile
+COMMAND_TIMEOUT = 10
+
+## Players apply next/previous asynchronously; the fetch after a skip polls the current track
+## up to SKIP_SETTLE_ATTEMPTS times, SKIP_SETTLE_DELAY seconds apart, until it has changed
+SKIP_SETTLE_ATTEMPTS, SKIP_SETTLE_DELAY = 10, 0.05
+
+## SSH transport settings per --link profile:
+##     compress           zlib compression, which helps metadata but not already compressed artwork
+##     ciphers, macs      preferred first, in this order; any others paramiko supports stay as fallbacks
+##     window_size        bytes in flight per channel before the remote waits for an acknowledgement
+##     sftp_requests      concurrent pipelined reads when transferring artwork
+##     keepalive          seconds between liveness probes
+##     keepalive_timeout  seconds a probe may take before the link is considered dead
+TRANSPORT_PROFILES = {
+    ## Fast and reliable: hardware-accelerated AES-GCM, no compression
+    "lan": {
+        "compress": False, "ciphers": ["aes128-gcm@openssh.com", "aes128-ctr"], "macs": ["hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"],
+        "window_size": 8 * 1024 * 1024, "sftp_requests": 64, "keepalive": 2, "keepalive_timeout": 2
+    },
+    ## High latency or congested (VPN, Wi-Fi): a window large enough to fill the link, deep pipelining, compression
+    "wan": {
+        "compress": True, "ciphers": ["aes128-gcm@openssh.com", "aes128-ctr"], "macs": ["hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"],
+        "window_size": 16 * 1024 * 1024, "sftp_requests": 128, "keepalive": 5, "keepalive_timeout": 8
+    },
+    ## Battery powered or slow CPUs on either end: cheapest cipher and MAC, fewer wakeups
+    "lowpower": {
+        "compress": False, "ciphers": ["aes128-ctr"], "macs": ["hmac-sha1", "hmac-sha2-256"],
+        "window_size": 2 * 1024 * 1024, "sftp_requests": 16, "keepalive": 15, "keepalive_timeout": 10
+    }
+}
+
+## Reconnect attempts start quickly, doubling the delay between them up to the maximum
+RECONNECT_DELAY, RECONNECT_MAX_DELAY = 0.25, 8
+
+## Seconds an operation may wait for a reconnect and still be replayed; anything else is
+## dropped, as a late toggle, skip or relative seek would act on state the user no longer sees
+REPLAY_WINDOW = {"volume": math.inf, "loop": math.inf, "pause": math.inf, "refresh": math.inf, "position": 5, "play_track": 10}
+
+## Seconds resolved addresses are reused for; getaddrinfo does not report record TTLs
+RESOLVE_TTL = 300
+
+## Addresses of a host are raced, each attempt starting this many seconds after the previous
+## one unless it failed sooner (RFC 8305); CONNECT_TIMEOUT bounds the whole race
+CONNECT_ATTEMPT_DELAY, CONNECT_TIMEOUT = 0.25, 5
+
+## Connection state indicator colors
+CONNECTION_STATE_COLORS = {"connecting": "orange", "connected": "green", "reconnecting": "orange", "failed": "red"}
+
+## Listings the browser can load, and the cmus save command streaming each of them
+BROWSER_SOURCES = {"cmus": {"Library": "save -e -l -", "Playlist": "save -e -p -"}, "agent": {"Tracklist": "tracklist"}}
+
+class hostSetupError(Exception):
+    ## A host which cannot work as configured (rejected password, missing remote dependency);
+    ## unlike connection_errors, retrying would not help, so it is not reconnected
+    pass
+
+@dataclass
+class mediaMetadata:
+    ## None marks a field which was not part of the fetch
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+    art_url: Optional[str] = None
+    status: Optional[str] = None
+    volume: Optional[int] = None
+    loop: Optional[str] = None
+    shuffle: Optional[bool] = None
+    ## Seconds into and length of the track, and the playback rate they advance at
+    position: Optional[float] = None
+    length: Optional[float] = None
+    rate: Optional[float] = None
+    ## Local artwork path, resolved from art_url off the GUI thread
+    image: Optional[str] = None
+
+class commandDispatcher:
+    def __init__(self, execute, acknowledge):
+        ## execute(operations) runs a batch remotely and returns its result,
+        ## acknowledge(operations, result) is then called from the worker thread
+        self.__execute__, self.__acknowledge__ = execute, acknowledge
+        self.__pending__, self.__busy__, self.__running__ = [], False, True
+        self.__condition__ = threading.Condition()
+        threading.Thread(target=self.__worker__, daemon=True).start()
+
+    def submit(self, operation, value=None):
+        ## Merge the new operation with queued work where the outcome is identical
+        with self.__condition__:
+            last = self.__pending__[-1] if self.__pending__ else (None, None)
+            if operation in ["seek", "next", "previous"] and last[0] == operation:
+                ## N seeks become one position delta, N skips one batch
+                self.__pending__[-1] = (operation, last[1] + value)
+            elif operation in ["play_pause", "shuffle_toggle"] and last[0] == operation:
+                ## Two toggles cancel each other out
+                self.__pending__.pop()
+            elif operation in ["volume", "loop", "refresh", "position", "play_track"]:
+                ## Only the latest value is of interest
+                self.__pending__ = [pending for pending in self.__pending__ if pending[0] != operation]
+                self.__pending__.append((operation, value))
+            else:
+                self.__pending__.append((operation, value))
+            self.__condition__.notify()
+
+    def idle(self):
+        with self.__condition__:
+            return not self.__pending__ and not self.__busy__
+
+    def stop(self):
+        with self.__condition__:
+            self.__running__ = False
+            self.__condition__.notify()
+
+    def __worker__(self):
+        while True:
+            with self.__condition__:
+                while self.__running__ and not self.__pending__:
+                    self.__condition__.wait()
+                if not self.__running__:
+                    return
+                operations, self.__pending__, self.__busy__ = self.__pending__, [], True
+            try:
+                result = self.__execute__(operations)
+            except Exception as e:
+                print(f"Failed to send commands {operations}: {e}")
+                result = None
+            with self.__condition__:
+                self.__busy__ = False
+            self.__acknowledge__(operations, result)
+
+class playbackClock:
+    def __init__(self):
+        ## Position is interpolated from the last sync, rather than polled from the host
+        self.__position__, self.__length__, self.__rate__, self.__playing__ = 0.0, None, 1.0, False
+        ## Set once the end of the track was reported, until a sync moves back before it
+        self.__synced__, self.__endReported__ = time.monotonic(), False
+        self.__lock__ = threading.Lock()
+
+    def sync(self, **kwargs):
+        ## Fields left as None keep their current (interpolated) value
+        with self.__lock__:
+            position = kwargs.get("position", None)
+            self.__position__ = self.__interpolate__() if position is None else max(position, 0.0)
+            self.__synced__ = time.monotonic()
+            if kwargs.get("length", None) is not None:
+                self.__length__ = kwargs["length"] or None
+            if kwargs.get("rate", None) is not None:
+                self.__rate__ = kwargs["rate"]
+            if kwargs.get("playing", None) is not None:
+                self.__playing__ = kwargs["playing"]
+            if not self.__length__ or self.__position__ < self.__length__:
+                self.__endReported__ = False
+
+    def seek(self, offset):
+        position = self.position() + offset
+        self.sync(position=min(position, self.__length__) if self.__length__ else position)
+
+    def __interpolate__(self):
+        position = self.__position__
+        if self.__playing__:
+            position += (time.monotonic() - self.__synced__) * self.__rate__
+        return min(position, self.__length__) if self.__length__ else position
+
+    def position(self):
+        with self.__lock__:
+            return self.__interpolate__()
+
+    def length(self):
+        return self.__length__
+
+    def playing(self):
+        return self.__playing__
+
+    def end_reached(self):
+        ## True once per track end; a host which stays at the end (stopped, or slow to skip)
+        ## is not asked again until a sync shows another position
+        with self.__lock__:
+            if self.__endReported__ or not self.__length__ or self.__interpolate__() < self.__length__:
+                return False
+            self.__endReported__ = True
+            return True
+
+    def until_next_second(self):
+        ## Milliseconds until the displayed second changes, for the window's read timeout
+        if not self.__playing__ or self.__rate__ <= 0:
+            return None
+        return int((1 - self.position() % 1) * 1000 / self.__rate__) + 10
+
+class latencyStats:
+    def __init__(self, trace_path=None, samples=512):
+        ## Rolling window of samples per (command, stage), optionally traced as JSON lines
+        self.__samples__, self.__size__ = {}, samples
+        self.__lock__ = threading.Lock()
+        self.__trace__ = open(trace_path, "a") if trace_path else None
+
+    def record(self, command, **stages):
+        ## Stage timings are milliseconds from the start of the command,
+        ## except bytes_per_second which is a transfer rate
+        with self.__lock__:
+            for stage, value in stages.items():
+                self.__samples__.setdefault((command, stage), deque(maxlen=self.__size__)).append(value)
+            if self.__trace__:
+                self.__trace__.write(json.dumps({"time": time.time(), "command": command, **stages}) + "\n")
+                self.__trace__.flush()
+
+    def percentiles(self):
+        ## {command: {stage: {"p50", "p95", "p99", "count"}}}
+        with self.__lock__:
+            samples = {key: sorted(values) for key, values in self.__samples__.items()}
+        summary = {}
+        for (command, stage), values in sorted(samples.items()):
+            summary.setdefault(command, {})[stage] = {
+                f"p{percentile}": values[max(math.ceil(percentile / 100 * len(values)) - 1, 0)] for percentile in [50, 95, 99]
+            }
+            summary[command][stage]["count"] = len(values)
+        return summary
+
+    def summary(self):
+        ## Plain text table for the stats pane
+        lines = [f"{'command':<18}{'stage':<17}{'p50':>9}{'p95':>9}{'p99':>9}{'n':>6}"]
+        for command, stages in self.percentiles().items():
+            for stage, values in stages.items():
+                lines.append(f"{command[:17]:<18}{stage:<17}{values['p50']:>9.1f}{values['p95']:>9.1f}{values['p99']:>9.1f}{values['count']:>6}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self.__trace__:
+            self.__trace__.close()
+
+class artCache:
+    def __init__(self, directory, max_bytes):
+        self.__directory__, self.__max_bytes__ = directory, max_bytes
+        self.__lock__ = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        ## In-memory LRU index of key -> size, oldest first; the directory is
+        ## only scanned here, cache hits just check their file is still there
+        self.__index__, self.__size__ = OrderedDict(), 0
+        ## Keys whose artwork could not be fetched or decoded, only kept for this session
+        self.__failed__ = set()
+        ## Other processes sharing the directory may rename or evict files while it is scanned
+        entries = []
+        for entry in os.scandir(directory):
+            try:
+                attributes = entry.stat()
+                if entry.name.endswith(".png"):
+                    entries.append((attributes.st_mtime, entry.name[:-4], attributes.st_size))
+                elif entry.name.endswith(".part") and time.time() - attributes.st_mtime > STALE_PART_AGE:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+        for mtime, key, size in sorted(entries):
+            self.__index__[key] = size
+            self.__size__ += size
+        self.__evict__()
+
+    def key(self, *parts):
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.__directory__, f"{key}.png")
+
+    def lookup(self, key):
+        with self.__lock__:
+            if key not in self.__index__:
+                return None
+            self.__index__.move_to_end(key)
+        if os.path.exists(self.path(key)):
+            return self.path(key)
+        ## Evicted by another process sharing the directory
+        with self.__lock__:
+            self.__size__ -= self.__index__.pop(key, 0)
+        return None
+
+    def failed(self, key):
+        return key in self.__failed__
+
+    def fail(self, key):
+        with self.__lock__:
+            self.__failed__.add(key)
+
+    def store(self, key, write):
+        ## write(path) fills a temporary file, which only becomes visible once complete
+        ## Named per process and thread, as the directory may be shared with another instance
+        partial = os.path.join(self.__directory__, f"{key}.{os.getpid()}.{threading.get_ident()}.part")
+        try:
+            write(partial)
+            size = os.path.getsize(partial)
+            os.replace(partial, self.path(key))
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+        with self.__lock__:
+            self.__size__ += size - self.__index__.pop(key, 0)
+            self.__index__[key] = size
+            self.__evict__()
+        return self.path(key)
+
+    def __evict__(self):
+        ## Drop least recently used entries until the cache fits its cap again
+        while self.__size__ > self.__max_bytes__ and len(self.__index__) > 1:
+            key, size = self.__index__.popitem(last=False)
+            self.__size__ -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+class libraryIndex:
+    def __init__(self):
+        ## Tracks are (title, artist, album, length, locator) tuples; artist and album are
+        ## interned, as tens of thousands of tracks share a few thousand distinct strings
+        self.__tracks__, self.__grams__ = [], {}
+        self.__lock__ = threading.Lock()
+
+    def __len__(self):
+        return len(self.__tracks__)
+
+    def add(self, tracks):
+        ## Called from the loading thread for each streamed chunk, while searches run
+        with self.__lock__:
+            for track in tracks:
+                entry = (track["title"], sys.intern(track["artist"]), sys.intern(track["album"]), track["length"], track["locator"])
+                position = len(self.__tracks__)
+                self.__tracks__.append(entry)
+                ## Postings stay sorted, as tracks are only ever appended
+                for gram in search_grams(search_text(entry)):
+                    self.__grams__.setdefault(gram, array("I")).append(position)
+
+    def track(self, position):
+        return self.__tracks__[position]
+
+    def search(self, query, within=None):
+        ## Words of 3+ characters match anywhere and are narrowed down by trigram,
+        ## shorter ones match the start of a word; returns positions in load order.
+        ## While typing, within holds the results of the query being extended
+        words = query.lower().split()
+        with self.__lock__:
+            count = len(self.__tracks__)
+            if not words:
+                return range(count)
+            postings = sorted((self.__grams__.get(gram, ()) for word in words for gram in
+                (trigrams(word) if len(word) >= 3 else [f" {word}"])), key=len)
+        candidates = set(within if within is not None else postings[0])
+        for posting in postings:
+            ## Postings much larger than the candidates cost more to intersect than to verify
+            if len(posting) > 8 * len(candidates):
+                break
+            candidates.intersection_update(posting)
+        candidates = sorted(position for position in candidates if position < count)
+        ## Trigrams only narrow the candidates down, every word must still match
+        matches = []
+        for position in candidates:
+            text = f" {search_text(self.__tracks__[position])}"
+            if all(word in text if len(word) >= 3 else f" {word}" in text for word in words):
+                matches.append(position)
+        return matches
+
+class resolverCache:
+    def __init__(self, ttl):
+        ## (host, port) -> (expiry, [(family, sockaddr)]), shared by every connection attempt
+        self.__ttl__, self.__entries__ = ttl, {}
+        self.__lock__ = threading.Lock()
+
+    def resolve(self, host, port):
+        with self.__lock__:
+            expiry, addresses = self.__entries__.get((host, port), (0, None))
+        if time.monotonic() < expiry:
+            return addresses
+        addresses = [(family, address) for family, _, _, _, address in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+        with self.__lock__:
+            self.__entries__[(host, port)] = (time.monotonic() + self.__ttl__, addresses)
+        return addresses
+
+    def forget(self, host, port):
+        with self.__lock__:
+            self.__entries__.pop((host, port), None)
+
+class cmusClient:
+    def __init__(self, host, port, password, **kwargs):
+        self.__address__, self.__password__ = (host, int(port)), password
+        ## Opens the TCP connection, see controller.__openSocket__
+        self.__open__ = kwargs.get("connect", lambda: socket.create_connection(self.__address__, timeout=5))
+        self.__socket__, self.__stream__ = None, None
+        self.__lock__ = threading.Lock()
+
+    def __connect__(self):
+        self.__socket__ = self.__open__()
+        self.__stream__ = self.__socket__.makefile("rb")
+        ## TCP clients must authenticate first; cmus acknowledges with an empty line, which has to be
+        ## read here or every later reply would be taken for the answer to the command before it
+        self.__socket__.sendall(f"passwd {self.__password__}\n".encode())
+        if any("authentication failed" in line for line in self.__response__()):
+            self.close()
+            raise hostSetupError(f"cmus at {self.__address__[0]}:{self.__address__[1]} rejected the password")
+
+    def command(self, command):
+        ## Send one command, returning its response lines (terminated by an empty line)
+        with self.__lock__:
+            ## A stale connection is re-established once before giving up
+            for attempt in range(2):
+                try:
+                    if not self.__socket__:
+                        self.__connect__()
+                    self.__socket__.sendall(f"{command}\n".encode())
+                    return list(self.__response__())
+                except OSError:
+                    self.close()
+                    if attempt:
+                        raise
+
+    def stream(self, command):
+        ## Yield response lines as they arrive, for responses too large to buffer (e.g. save -e -l -)
+        with self.__lock__:
+            try:
+                if not self.__socket__:
+                    self.__connect__()
+                self.__socket__.sendall(f"{command}\n".encode())
+                yield from self.__response__()
+            except (OSError, GeneratorExit):
+                ## An abandoned response would be read as the reply to the next command
+                self.close()
+                raise
+
+    def __response__(self):
+        while True:
+            line = self.__stream__.readline()
+            if not line:
+                raise ConnectionError("cmus closed the connection, is the password correct?")
+            if line == b"\n":
+                return
+            yield line.decode("utf8", "replace").rstrip("\n")
+
+    def close(self):
+        if self.__socket__:
+            self.__stream__.close()
+            self.__socket__.close()
+            self.__socket__, self.__stream__ = None, None
+
+class agentClient:
+    ## Remote location of the helper, relative to the SFTP home directory
+    remote_path = ".cache/remote-media-controller-agent.py"
+
+    def __init__(self, session, on_event):
+        ## Upload remote_agent.py and start it on one persistent channel
+        file_transfer = session.open_sftp()
+        try:
+            file_transfer.mkdir(".cache")
+        except IOError:
+            pass
+        file_transfer.put(os.path.join(os.path.dirname(os.path.abspath(__file__)), "remote_agent.py"), self.remote_path)
+        file_transfer.close()
+
+        self.__channel__ = session.get_transport().open_session()
+        self.__channel__.exec_command(f"exec python3 -u {self.remote_path}")
+        self.__on_event__, self.__waiting__, self.__next_id__ = on_event, {}, 0
+        self.__lock__, self.__closed__ = threading.Lock(), False
+        ## Reason the agent gave for exiting at startup, see remote_agent.py
+        self.__fatal__ = None
+        threading.Thread(target=self.__reader__, daemon=True).start()
+
+    def request(self, command, value=None, timeout=10, on_chunk=None):
+        ## Send one request and block until its response arrives;
+        ## partial results of streamed requests are passed to on_chunk as they arrive
+        with self.__lock__:
+            if self.__closed__:
+                raise hostSetupError(self.__fatal__) if self.__fatal__ else ConnectionError("Agent channel closed")
+            self.__next_id__ += 1
+            request_id, response = self.__next_id__, [threading.Event(), None, on_chunk]
+            self.__waiting__[request_id] = response
+            try:
+                self.__channel__.sendall((json.dumps({"id": request_id, "command": command, "value": value}) + "\n").encode())
+            except OSError:
+                ## The agent is gone; the reader fails this request once it reaches the end of the channel,
+                ## knowing by then whether the agent reported why
+                pass
+        if not response[0].wait(timeout):
+            self.__waiting__.pop(request_id, None)
+            raise TimeoutError(f"Agent did not answer {command}")
+        if "closed" in response[1]:
+            raise hostSetupError(self.__fatal__) if self.__fatal__ else ConnectionError(f"Agent channel closed before answering {command}")
+        if "error" in response[1]:
+            raise RuntimeError(response[1]["error"])
+        return response[1]["result"]
+
+    def close(self):
+        self.__channel__.close()
+
+    def __reader__(self):
+        try:
+            for line in self.__channel__.makefile("r"):
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if "fatal" in message:
+                    self.__fatal__ = message["fatal"]
+                elif "event" in message:
+                    self.__on_event__(message["result"])
+                elif "chunk" in message and message.get("id") in self.__waiting__:
+                    self.__waiting__[message["id"]][2](message["chunk"])
+                elif message.get("id") in self.__waiting__:
+                    response = self.__waiting__.pop(message["id"])
+                    response[1] = message
+                    response[0].set()
+        finally:
+            ## Requests still waiting fail now, rather than each running into its timeout
+            with self.__lock__:
+                self.__closed__, waiting, self.__waiting__ = True, self.__waiting__, {}
+            for response in waiting.values():
+                response[1] = {"closed": True}
+                response[0].set()
+
+class daemonRequestHandler(socketserver.StreamRequestHandler):
+    ## One JSON request per line, answered by one JSON response line
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.controller.__handleRequest__(json.loads(line), self.server)
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode())
 
 class controller:
     def __init__(self, parameters, version):
-        self.__version__ = version
+        self.__version__, self.__parameters__ = version, parameters
         self.__lock_dir__ = "/tmp/remote-media-controller"
 
-        # TODO: Add IPv6 regex + general IPv6 support
-        self.ipv4_pattern = re.compile("[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}")
-        self.ipv6_pattern = None
+        ## IPv4 and IPv6 literals are checked with ipaddress, anything else must be a valid hostname
+        self.hostname_pattern = re.compile(r"(?=.{1,253}$)[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*\.?")
         ## Pre-define PySimpleGUI output variables for while loop in __openWindow__()
         self.__event__, self.__values__ = True, ""
 
@@ -46,39 +642,291 @@ class controller:
         self.__remoteHostPassword__ = parameters.get("password", None)
         self.__sshKeyfile__ = parameters.get("ssh_keyfile", None)
         self.__mode__ = parameters.get("mode", "cmus")
+        self.__follow__ = parameters.get("follow", False)
+        self.__daemon__ = parameters.get("daemon", False)
+        ## Headless instances (see benchmark.py) connect and fetch, then return to the caller
+        self.__headless__ = parameters.get("headless", False)
+        self.__socketPath__ = parameters.get("socket", default_socket_path())
+        self.__profileStartup__ = parameters.get("profile_startup", False)
+        self.__showStats__ = parameters.get("stats", False)
+        ## SSH transport tuning, see TRANSPORT_PROFILES
+        self.__linkProfile__ = TRANSPORT_PROFILES[parameters.get("link", "lan")]
 
-        if self.__mode__ in ["ssh", "playerctl"]:
-            self.__getSSHSession__()
+        ## Every command and transfer is timed, see latencyStats
+        self.__stats__ = latencyStats(parameters.get("trace", None))
+        self.__followChannel__, self.__window__ = None, None
+        ## Agent events are numbered, so only the latest one reaches the window, see __agentEvent__
+        self.__agentEvents__ = 0
 
-        ## Obtain lockfile on current host IP
-        try:
-            if not self.__getIPcontrolLock__():
-                raise Exception("Encountered unknown issue obtaining process lock")
-        except FileExistsError:
-            raise
+        ## Artwork is cached locally, transferred over one reused SFTP client per host
+        self.__artCache__ = artCache(parameters.get("cache_dir", default_cache_dir()), parameters.get("cache_size", 64) * 1024 * 1024)
+
+        ## Warm connections keyed by user@host:port; group actions fan out over the executor
+        self.__hostPool__, self.__hostExecutor__ = {}, ThreadPoolExecutor(thread_name_prefix="remote-media-controller")
+        ## Liveness probes get their own thread, so a backlog of commands cannot delay them into a false timeout
+        self.__probeExecutor__ = ThreadPoolExecutor(max_workers=1, thread_name_prefix="remote-media-controller-probe")
+        ## Keys of hosts added from the window which are still connecting
+        self.__pendingHosts__ = set()
+        self.__connection__ = None
+        ## Unlocked SSH key (or password) kept for reconnects, see __unlockCredentials__
+        self.__sshKey__, self.__sshPassword__ = None, None
+        ## Hostnames are resolved once per RESOLVE_TTL, not on every (re)connect
+        self.__resolver__ = resolverCache(RESOLVE_TTL)
+        self.__closing__, self.__monitoring__ = False, False
+        ## Every lock this process holds, so __shutdown__ gives back even those whose host never connected
+        self.__locks__ = set()
+        ## Additional hosts given without a port use the main host's
+        hosts = [(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__)] + [
+            (user, host, port or self.__remoteHostPort__) for user, host, port in parameters.get("hosts", [])
+        ]
+
+        ## Placeholder state, shown until the first fetch arrives
+        self.__metadata__ = {"title": "Connecting...", "artist": "Unknown Artist", "album": "Unknown Album", "image": "default.png"}
 
         ## Default seek duration is 5 seconds
-        self.__seekDuration__, self.__playbackVolume__ = "5S", 100
+        self.__seekDuration__, self.__playbackVolume__ = 5, 100
+
+        ## Track progress runs on a local clock, synced by fetches, events and drift checks
+        self.__clock__, self.__nextSync__, self.__seeking__ = playbackClock(), 0, False
+        self.__progressText__ = None
+
+        ## Values last pushed to each widget, and decoded artwork keyed by local path
+        self.__shown__, self.__images__ = {}, OrderedDict()
+
+        ## Library browser state; the index is replaced whenever another listing is loaded
+        self.__library__, self.__browserResults__, self.__browserQuery__, self.__browserOffset__ = None, [], "", 0
 
         ## Repeat is assumed to be playlist
         # NOTE: Many media players do not respect playerctl's loop instructions
         # NOTE: hence, only 'track' is an effective repeat state
         self.__repeatState__, self.__playState__, self.__shuffleState__ = "playlist", "paused", True
 
-        self.__fetchMetadata__(include_volume=True, include_play_state=True, include_playback_controls=True)
-        self.__openWindow__()
-        self.__getIPcontrolLock__(release=True)
+        try:
+            if self.__daemon__ or self.__headless__:
+                self.__connectHosts__(hosts)
+                self.__connection__ = self.__hostPool__[host_key(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__)]
+                self.__fetchMetadata__(include_volume=True, include_play_state=True, include_playback_controls=True)
+                if self.__headless__:
+                    ## Embedding code drives the instance itself and calls __shutdown__()
+                    return
+                self.__serveDaemon__()
+            else:
+                ## The window is shown first, connecting and fetching happen behind it
+                self.__lockHosts__(hosts)
+                self.__openWindow__(hosts)
+        except BaseException:
+            self.__shutdown__()
+            raise
+        self.__shutdown__()
 
-    def __getSSHSession__(self):
-        ## Create SSH Session
-        self.__session__ = SSHClient()
-        self.__session__.set_missing_host_key_policy(AutoAddPolicy())
+    def __shutdown__(self):
+        self.__closing__ = True
+        for connection in self.__hostPool__.values():
+            self.__disconnect__(connection)
+        self.__hostPool__ = {}
+        for key in list(self.__locks__):
+            self.__getIPcontrolLock__(release=True, key=key)
+        self.__hostExecutor__.shutdown(wait=False)
+        self.__probeExecutor__.shutdown(wait=False)
+        self.__stats__.close()
 
+    def __connectHosts__(self, hosts):
+        self.__lockHosts__(hosts)
+        try:
+            ## One passphrase unlocks every host, it is only asked for until credentials are held
+            if self.__mode__ in ["ssh", "playerctl", "agent"] and self.__sshKey__ is None and self.__sshPassword__ is None:
+                self.__unlockCredentials__(self.__getSSHPassphrase__())
+            self.__poolHosts__(hosts)
+        except KeyboardInterrupt:
+            print("\nConnection aborted")
+            exit()
+
+    def __lockHosts__(self, hosts):
+        ## Obtain lockfile on each host IP
+        for user, host, port in hosts:
+            try:
+                if not self.__getIPcontrolLock__(key=host_key(user, host, port)):
+                    raise Exception("Encountered unknown issue obtaining process lock")
+            except FileExistsError:
+                raise
+
+    def __poolHosts__(self, hosts):
+        ## Hosts are connected concurrently, so startup waits on the slowest host only
+        try:
+            for connection in self.__hostExecutor__.map(lambda host: self.__connect__(*host), hosts):
+                ## The window may have been closed while hosts were still connecting
+                if self.__closing__:
+                    self.__disconnect__(connection)
+                    continue
+                self.__hostPool__[host_key(connection["user"], connection["host"], connection["port"])] = connection
+        except Exception:
+            ## Hosts which failed to connect give their locks back
+            for user, host, port in hosts:
+                key = host_key(user, host, port)
+                if key not in self.__hostPool__ and key in self.__locks__:
+                    self.__getIPcontrolLock__(release=True, key=key)
+            raise
+        ## Dead SSH links are detected by probing, rather than by the next command hanging
+        if self.__mode__ in ["ssh", "playerctl", "agent"] and not self.__monitoring__:
+            self.__monitoring__ = True
+            threading.Thread(target=self.__monitorConnections__, daemon=True).start()
+
+    def __startup__(self, hosts, ssh_passphrase, modules):
+        ## Runs behind the window: waits for paramiko, connects, then fetches once
+        try:
+            modules.result()
+            self.__unlockCredentials__(ssh_passphrase)
+            del ssh_passphrase
+            self.__poolHosts__(hosts)
+            connection = self.__hostPool__[host_key(*hosts[0])]
+            self.__window__.write_event_value("connected", (connection, self.__executeOperations__([("refresh", None)], connection=connection)))
+        except Exception as e:
+            self.__window__.write_event_value("connection_failed", e)
+
+    def __connect__(self, user, host, port):
+        connection = {
+            "user": user, "host": host, "port": port, "session": None, "cmus": None, "agent": None, "sftp": None, "sftp_lock": threading.Lock(),
+            ## Reconnects reopen the resources above in place; backlog holds (operation, value, queued) awaiting replay
+            "state": "connecting", "backlog": [], "state_lock": threading.Lock(),
+            ## Whether the host has ImageMagick, None until the first artwork is fetched
+            "thumbnailer": None
+        }
+        self.__openConnection__(connection)
+        connection["state"] = "connected"
+        return connection
+
+    def __openConnection__(self, connection):
+        if self.__mode__ in ["ssh", "playerctl", "agent"]:
+            connection["session"] = self.__getSSHSession__(connection["user"], connection["host"], connection["port"])
+        if self.__mode__ == "agent":
+            connection["agent"] = agentClient(connection["session"], lambda state: self.__agentEvent__(connection, state))
+            ## An agent missing its dependencies exits straight away, which has to fail here rather than on the first command
+            connection["agent"].request("state")
+        elif self.__mode__ == "cmus":
+            ## One authenticated connection is kept open for every command; it connects lazily,
+            ## so a status command makes a reconnect fail here rather than on the replay
+            connection["cmus"] = cmusClient(connection["host"], connection["port"], self.__remoteHostPassword__,
+                connect=lambda: self.__openSocket__(connection["host"], connection["port"]))
+            connection["cmus"].command("status")
+
+    def __disconnect__(self, connection):
+        if connection["agent"]:
+            connection["agent"].close()
+        if connection["cmus"]:
+            connection["cmus"].close()
+        with connection["sftp_lock"]:
+            if connection["sftp"]:
+                connection["sftp"].close()
+        if connection["session"]:
+            connection["session"].close()
+        connection["session"], connection["cmus"], connection["agent"], connection["sftp"] = None, None, None, None
+
+    def __reconnect__(self, connection):
+        ## Only one reconnect runs per connection, commands meanwhile are queued or dropped
+        with connection["state_lock"]:
+            if connection["state"] == "reconnecting" or self.__closing__:
+                return
+            connection["state"] = "reconnecting"
+        self.__connectionStateChanged__(connection)
+        threading.Thread(target=self.__reconnectWorker__, args=(connection,), daemon=True).start()
+
+    def __reconnectWorker__(self, connection):
+        ## Credentials are held in memory, so no passphrase is asked for again
+        delay = RECONNECT_DELAY
+        while not self.__closing__:
+            self.__disconnect__(connection)
+            try:
+                self.__openConnection__(connection)
+                break
+            except hostSetupError as e:
+                print(f"Not reconnecting to {host_key(connection['user'], connection['host'], connection['port'])}: {e}")
+                with connection["state_lock"]:
+                    connection["state"] = "failed"
+                self.__connectionStateChanged__(connection)
+                return
+            except Exception as e:
+                print(f"Reconnecting to {host_key(connection['user'], connection['host'], connection['port'])} failed, retrying in {delay:g}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        else:
+            return
+
+        with connection["state_lock"]:
+            backlog, connection["backlog"], connection["state"] = connection["backlog"], [], "connected"
+        self.__connectionStateChanged__(connection)
+
+        ## Replay what is still wanted, then resync with whatever changed remotely meanwhile
+        now = time.monotonic()
+        operations = [(operation, value) for operation, value, queued in backlog if now - queued <= REPLAY_WINDOW[operation]]
+        record = self.__executeOperations__(operations + [("refresh", None)], connection=connection)
+        if record and self.__window__ and connection is self.__connection__:
+            self.__window__.write_event_value("metadata_update", record)
+
+    def __connectionStateChanged__(self, connection):
+        if self.__window__ and connection is self.__connection__:
+            self.__window__.write_event_value("connection_state", connection)
+
+    def __monitorConnections__(self):
+        ## paramiko does not notice a silently dropped link until the next command times out,
+        ## so every transport is probed with a global request the server has to answer
+        while not self.__closing__:
+            time.sleep(self.__linkProfile__["keepalive"])
+            for connection in list(self.__hostPool__.values()):
+                if connection["state"] != "connected" or not connection["session"]:
+                    continue
+                transport = connection["session"].get_transport()
+                try:
+                    if transport and transport.is_active():
+                        self.__probeExecutor__.submit(transport.global_request, "keepalive@openssh.com", wait=True).result(self.__linkProfile__["keepalive_timeout"])
+                    alive = transport is not None and transport.is_active()
+                except (FutureTimeout, RuntimeError):
+                    alive = False
+                if not alive and not self.__closing__:
+                    ## Closing the transport also releases anything blocked on it
+                    if transport:
+                        transport.close()
+                    self.__reconnect__(connection)
+
+    def __openSocket__(self, host, port):
+        ## Every resolved address is raced, so a dead first address costs CONNECT_ATTEMPT_DELAY instead of the timeout
+        addresses = interleave_families(self.__resolver__.resolve(host, int(port)))
+        try:
+            return connect_racing(addresses, CONNECT_TIMEOUT)
+        except OSError:
+            ## The host may have moved, so it is resolved again on the next attempt
+            self.__resolver__.forget(host, int(port))
+            raise
+
+    def __unlockCredentials__(self, ssh_passphrase):
+        ## Credentials stay in memory for reconnects; a key file is decrypted once here,
+        ## so only the unlocked key is kept rather than its passphrase
+        if self.__mode__ not in ["ssh", "playerctl", "agent"]:
+            return
+        if not self.__sshKeyfile__:
+            self.__sshPassword__ = ssh_passphrase
+            return
+        path = os.path.join(os.path.expanduser('~'), ".ssh", self.__sshKeyfile__)
+        for key_type in private_key_types:
+            try:
+                self.__sshKey__ = key_type.from_private_key_file(path, password=ssh_passphrase)
+                return
+            except SSHException:
+                continue
+        raise SSHException(f"Could not unlock {path}, is the passphrase correct?")
+
+    def __getSSHPassphrase__(self):
         if not self.__sshKeyfile__:
             sshPrompt = f"SSH Password for {self.__remoteHost__}: "
         else:
             sshPrompt = f"Unlock SSH Key {self.__sshKeyfile__}: "
 
+        ## Headless callers hand the passphrase over directly
+        if self.__headless__:
+            return self.__parameters__.get("ssh_passphrase", None)
+        ## Daemons have no window, so ask on the terminal they were started from
+        if self.__daemon__:
+            return getpass.getpass(sshPrompt)
+
         layout = [
             [gui.Text(sshPrompt)],
             [gui.InputText(key="ssh_passphrase", password_char="*", size=(20, 5)),
@@ -90,32 +938,126 @@ class controller:
 
         event, values = passphraseWindow.read()
 
+        ssh_passphrase = None
         if event == "submit_passphrase":
             ssh_passphrase = values.get("ssh_passphrase", None)
 
         passphraseWindow.close()
+        return ssh_passphrase
 
-        try:
-            if not self.__sshKeyfile__:
-                self.__session__.connect(self.__remoteHost__, username=self.__remoteHostUser__, look_for_keys=True, password=ssh_passphrase, port=self.__remoteHostPort__, timeout=5)
+    def __getSSHSession__(self, user, host, port):
+        ## Create SSH Session
+        session = SSHClient()
+        session.set_missing_host_key_policy(AutoAddPolicy())
+
+        ## paramiko is handed the socket which won the address race, and a transport set up for the link
+        sock, profile = self.__openSocket__(host, port), self.__linkProfile__
+        options = {"port": port, "timeout": 5, "sock": sock, "compress": profile["compress"], "transport_factory": self.__createTransport__}
+        if not self.__sshKeyfile__:
+            session.connect(host, username=user, look_for_keys=True, password=self.__sshPassword__, **options)
+        else:
+            session.connect(host, username=user, look_for_keys=False, pkey=self.__sshKey__, **options)
+        ## Keeps NAT and firewall state alive between commands
+        session.get_transport().set_keepalive(profile["keepalive"])
+        return session
+
+    def __createTransport__(self, sock, **kwargs):
+        ## Called by SSHClient.connect before negotiation starts, see TRANSPORT_PROFILES
+        profile = self.__linkProfile__
+        ## paramiko's 32 KiB maximum packet is kept: SFTP reads are requested 32 KiB at a time, and
+        ## larger packets made no measurable difference to artwork transfers (see benchmark.py)
+        transport = Transport(sock, default_window_size=profile["window_size"], **kwargs)
+        options = transport.get_security_options()
+        ## Only reordered, so algorithms this paramiko lacks are skipped rather than rejected
+        options.ciphers = tuple(sorted(options.ciphers, key=lambda cipher: profile["ciphers"].index(cipher) if cipher in profile["ciphers"] else len(profile["ciphers"])))
+        options.digests = tuple(sorted(options.digests, key=lambda mac: profile["macs"].index(mac) if mac in profile["macs"] else len(profile["macs"])))
+        return transport
+
+    def __openSFTP__(self, connection):
+        ## Artwork channels get the profile's window, rather than paramiko's SFTP defaults
+        return SFTPClient.from_transport(connection["session"].get_transport(),
+            window_size=self.__linkProfile__["window_size"])
+
+    def __serveDaemon__(self):
+        ## Serve ctl clients over a UNIX socket until interrupted or asked to quit
+        self.__stateLock__ = threading.Lock()
+        if os.path.exists(self.__socketPath__):
+            ## Host locks are per host, while daemons for other hosts may share the socket path;
+            ## only a socket nobody answers on is left over from a daemon that did not exit cleanly
+            try:
+                with socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(self.__socketPath__)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if os.path.exists(self.__socketPath__):
+                    os.remove(self.__socketPath__)
             else:
-                self.__session__.connect(self.__remoteHost__, username=self.__remoteHostUser__, look_for_keys=True, key_filename=os.path.join(os.path.expanduser('~'), ".ssh", self.__sshKeyfile__), passphrase=ssh_passphrase, port=self.__remoteHostPort__, timeout=5)
+                raise FileExistsError(f"Another daemon is listening on {self.__socketPath__}, use --socket to run a second one")
+        server = socketserver.ThreadingUnixStreamServer(self.__socketPath__, daemonRequestHandler)
+        os.chmod(self.__socketPath__, 0o600)
+        ## Identifies this daemon's socket, so exiting never removes a path another daemon has taken over
+        socket_inode = os.stat(self.__socketPath__).st_ino
+        server.daemon_threads, server.controller = True, self
+        print(f"Listening on {self.__socketPath__}")
+        try:
+            server.serve_forever()
         except KeyboardInterrupt:
-            print("\nConnection aborted")
-            exit()
+            pass
         finally:
-            del ssh_passphrase
+            server.server_close()
+            if os.path.exists(self.__socketPath__) and os.stat(self.__socketPath__).st_ino == socket_inode:
+                os.remove(self.__socketPath__)
+
+    def __handleRequest__(self, request, server):
+        command, value = request.get("command"), request.get("value")
+        if command == "quit":
+            ## shutdown() waits for serve_forever, so it cannot run on this thread
+            threading.Thread(target=server.shutdown).start()
+            return {"ok": True}
+
+        if command == "status":
+            operations = [("refresh", None)]
+        elif command in ["play_pause", "pause", "shuffle_toggle"]:
+            operations = [(command, None)]
+        elif command in ["next", "previous"]:
+            operations = [(command, int(value or 1))]
+        elif command == "seek":
+            operations = [("seek", int(value) if value else self.__seekDuration__)]
+        elif command == "volume" and value and int(str(value).replace("%", "")) in range(0, 101):
+            operations = [("volume", int(str(value).replace("%", "")))]
+        elif command == "loop" and value in ["playlist", "track", "none"]:
+            operations = [("loop", value)]
+        else:
+            return {"ok": False, "error": f"Invalid command: {command} {value or ''}".strip()}
+
+        if request.get("all"):
+            ## Every pooled host runs concurrently, the current host's state is reported
+            futures = {key: self.__hostExecutor__.submit(self.__executeOperations__, operations, connection=connection) for key, connection in self.__hostPool__.items()}
+            errors = [f"{key}: {future.exception()}" for key, future in futures.items() if future.exception()]
+            if errors:
+                return {"ok": False, "error": "; ".join(errors)}
+            record = futures[host_key(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__)].result()
+        else:
+            record = self.__executeOperations__(operations)
+        if record is None:
+            return {"ok": False, "error": "Connection lost, reconnecting"}
+        with self.__stateLock__:
+            self.__applyMetadataRecord__(record)
+        return {"ok": True, "state": asdict(record)}
 
     def __getIPcontrolLock__(self, **kwargs):
         release_lock = kwargs.get("release", False)
+        ## Locks are per user@host:port, so one box can be controlled as several users or ports
+        key = kwargs.get("key", host_key(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__))
+        lock_path = f"{self.__lock_dir__}/{lock_name(key)}.lock"
         if release_lock:
-            if os.path.exists(f"{self.__lock_dir__}/{self.__remoteHost__.replace('.', '-')}.lock"):
-                os.remove(f"{self.__lock_dir__}/{self.__remoteHost__.replace('.', '-')}.lock")
+            if os.path.exists(lock_path):
+                os.remove(lock_path)
+                self.__locks__.discard(key)
             else:
-                raise FileNotFoundError(f"No lock for host {self.__remoteHost__} exists")
+                raise FileNotFoundError(f"No lock for host {key} exists")
         else:
-            if os.path.exists(f"{self.__lock_dir__}/{self.__remoteHost__.replace('.', '-')}.lock"):
-                raise FileExistsError(f"Process already has lock for host {self.__remoteHost__}")
+            if os.path.exists(lock_path):
+                raise FileExistsError(f"Process already has lock for host {key}")
                 return False
             else:
                 try:
@@ -123,16 +1065,19 @@ class controller:
                 except FileExistsError:
                     pass
 
-                with open(f"{self.__lock_dir__}/{self.__remoteHost__.replace('.', '-')}.lock", "wb") as lock_file:
+                with open(lock_path, "wb") as lock_file:
                     lock_file.write(b"")
+                self.__locks__.add(key)
                 return True
 
-    def __openWindow__(self):
+    def __openWindow__(self, hosts):
         self.__layout__ = [
             [
                 gui.Text("IP Address: "),
-                gui.InputText(key="remote_address", default_text=f"{self.__remoteHostUser__}@{self.__remoteHost__}:{self.__remoteHostPort__}", size=(8,5)),
-                gui.Button("🔄", key="refresh_metadata", tooltip="Refresh Metadata")
+                ## Pooled hosts can be picked directly, new ones typed in and refreshed
+                gui.Combo(list(self.__hostPool__), key="remote_address", default_value=host_key(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__), size=(8,5), enable_events=True),
+                gui.Button("🔄", key="refresh_metadata", tooltip="Refresh Metadata"),
+                gui.Text("●", key="connection_state", text_color=CONNECTION_STATE_COLORS["connecting"], tooltip="Connecting", font="Courier 16")
             ], [
                 gui.Text(self.__metadata__.get("title", "Unknown Track"), key="current_title", size=(25,2))
             ], [
@@ -149,8 +1094,35 @@ class controller:
                 gui.Button("⏩︎", key="seek_forward", tooltip="Seek Forwards"),
                 gui.Button("⏭︎", key="next", tooltip="Next Track")
             ], [
-                gui.Image(self.__metadata__.get("image", "default.png"), size=(384,384), key="current_image"),
+                ## Elapsed and remaining time, advanced locally between syncs; click or drag to seek
+                gui.Text(format_duration(0), key="elapsed_time", size=(8,1), font="Courier 12"),
+                gui.Slider(range=(0,1000), key="progress", orientation="h", size=(25,10), disable_number_display=True),
+                gui.Text("", key="remaining_time", size=(8,1), font="Courier 12")
+            ], [
+                gui.Image(self.__metadata__.get("image", "default.png"), size=THUMBNAIL_SIZE, key="current_image"),
                 gui.Slider(range=(0,100), key="volume_control", orientation="v", default_value=self.__playbackVolume__)
+            ], [
+                ## Group actions apply to every pooled host at once
+                gui.Button("⏸︎ All", key="group_pause", tooltip="Pause All Hosts"),
+                gui.Button("🔊 All", key="group_volume", tooltip="Set Volume on All Hosts"),
+                gui.Button("📚", key="browser_toggle", tooltip="Browse Library", disabled=self.__mode__ not in BROWSER_SOURCES)
+            ], [
+                ## Library browser; only BROWSER_ROWS rows exist, filled from the visible slice of results
+                gui.Column([
+                    [
+                        gui.Combo(list(BROWSER_SOURCES.get(self.__mode__, {})), key="browser_source", default_value=next(iter(BROWSER_SOURCES.get(self.__mode__, {})), None), readonly=True, enable_events=True, font="Courier 12"),
+                        gui.Input("", key="browser_search", size=(30,1), enable_events=True, font="Courier 12", tooltip="Search"),
+                        gui.Button("▶", key="browser_play", tooltip="Play Selected Track", font="Courier 12")
+                    ], [
+                        gui.Listbox([], key="browser_rows", size=(62, BROWSER_ROWS), bind_return_key=True, no_scrollbar=True, font="Courier 12"),
+                        gui.Slider(range=(0,0), key="browser_scroll", orientation="v", size=(10,15), disable_number_display=True, enable_events=True)
+                    ], [
+                        gui.Text("", key="browser_status", size=(60,1), font="Courier 8")
+                    ]
+                ], key="browser_pane", visible=False)
+            ], [
+                ## Latency percentiles (ms) per command and stage, shown with --stats
+                gui.Multiline("", key="stats_panel", size=(66, 10), font="Courier 8", disabled=True, visible=self.__showStats__)
             ], [
                 self.__generateCopyrightElement__()
             ]
@@ -166,22 +1138,143 @@ class controller:
 
         ## Update client each time volume is updated
         window["volume_control"].bind('<ButtonRelease-1>', "-update")
+        ## Progress updates are held back while the bar is being dragged
+        window["progress"].bind('<ButtonPress-1>', "-drag")
+        window["progress"].bind('<ButtonRelease-1>', "-update")
+        ## Scrolling the browser rows moves the visible slice (X11 reports the wheel as buttons 4/5)
+        window["browser_rows"].bind('<MouseWheel>', "-wheel")
+        window["browser_rows"].bind('<Button-4>', "-up")
+        window["browser_rows"].bind('<Button-5>', "-down")
+        if self.__profileStartup__:
+            print(f"Time to window: {(time.perf_counter() - STARTUP_TIME) * 1000:.0f} ms")
+
+        ## paramiko is imported while the passphrase is typed, then hosts connect in the background
+        modules = self.__hostExecutor__.submit(load_modules, gui=False)
+        ssh_passphrase = self.__getSSHPassphrase__() if self.__mode__ in ["ssh", "playerctl", "agent"] else None
+        ## Set before startup runs, which reports back (and forwards agent events) through the window
+        self.__window__ = window
+        threading.Thread(target=self.__startup__, args=(hosts, ssh_passphrase, modules), daemon=True).start()
+        del ssh_passphrase
+
+        ## Commands are sent from a background thread, results arrive as "command_ack"
+        self.__dispatcher__ = commandDispatcher(self.__executeOperations__, lambda operations, result: window.write_event_value("command_ack", result))
 
         while self.__event__:
-            self.__event__, self.__values__ = window.read()
+            ## Wake once per displayed second while playing, otherwise only on events
+            self.__event__, self.__values__ = window.read(timeout=self.__clock__.until_next_second())
 
-            if self.__event__ == "volume_control-update":
+            if self.__event__ == gui.TIMEOUT_KEY:
+                ## Position is only fetched at the end of a track, or to correct drift
+                if self.__connection__ and (self.__clock__.end_reached() or time.monotonic() >= self.__nextSync__):
+                    self.__nextSync__ = time.monotonic() + DRIFT_CHECK_INTERVAL
+                    self.__sendCommand__("refresh")
+                self.__updateProgress__(window)
+                continue
+
+            if self.__event__ == "connected":
+                self.__connection__, record = self.__values__[self.__event__]
+                window["remote_address"].update(values=list(self.__hostPool__), value=host_key(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__))
+                self.__showConnectionState__(window)
+                ## No record if the link dropped straight away, the reconnect delivers one
+                if record:
+                    self.__applyMetadataRecord__(record)
+                self.__refreshWindow__(window)
+                if self.__profileStartup__:
+                    print(f"Time to first metadata: {(time.perf_counter() - STARTUP_TIME) * 1000:.0f} ms")
+                ## Follow mode pushes remote changes in as "follow_update" events
+                self.__startFollower__(window)
+            elif self.__event__ in ["host_connected", "host_failed"]:
+                if self.__event__ == "host_connected":
+                    user, host, port = self.__values__[self.__event__]
+                    self.__switchHost__(user, host, port)
+                    self.__sendCommand__("refresh")
+                else:
+                    (user, host, port), error = self.__values__[self.__event__]
+                    print(f"Could not connect to {host_key(user, host, port)}: {error}")
+                self.__pendingHosts__.discard(host_key(user, host, port))
+                window["remote_address"].update(values=list(self.__hostPool__), value=host_key(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__))
+            elif self.__event__ == "connection_failed":
+                window.close()
+                raise self.__values__[self.__event__]
+            elif self.__event__ == "connection_state":
+                ## Sent for the current connection only; a restored link needs its follower back
+                if self.__values__[self.__event__] is self.__connection__:
+                    self.__showConnectionState__(window)
+                    if self.__connection__["state"] == "connected":
+                        self.__stopFollower__()
+                        self.__startFollower__(window)
+            elif self.__event__ == "follow_update":
+                self.__applyFollowUpdate__(window, self.__values__[self.__event__])
+            elif self.__event__ in ["command_ack", "metadata_update"]:
+                ## Reconcile optimistic state only once no further commands are in flight
+                if self.__values__[self.__event__] and self.__dispatcher__.idle():
+                    self.__applyMetadataRecord__(self.__values__[self.__event__])
+                    self.__refreshWindow__(window)
+                if self.__showStats__:
+                    window["stats_panel"].update(self.__stats__.summary())
+            elif self.__event__ == "progress-drag":
+                self.__seeking__ = True
+                ## Tk moves the slider one step towards a click on the trough; jump to the click
+                ## instead, the release below then seeks there
+                slider, click = window["progress"].Widget, window["progress"].user_bind_event
+                if slider.identify(click.x, click.y).startswith("trough"):
+                    window["progress"].update(int(min(max(click.x / max(slider.winfo_width(), 1), 0), 1) * 1000))
+            elif self.__event__ == "progress-update":
+                self.__seeking__ = False
+                if self.__connection__ and self.__clock__.length():
+                    position = int(self.__values__.get("progress", 0) / 1000 * self.__clock__.length())
+                    self.__dispatcher__.submit("position", position)
+                    self.__clock__.sync(position=position)
+                self.__updateProgress__(window)
+            elif self.__event__ == "browser_toggle":
+                visible = not window["browser_pane"].visible
+                window["browser_pane"].update(visible=visible)
+                if visible and not self.__library__:
+                    self.__loadLibrary__(window)
+            elif self.__event__ == "browser_source":
+                self.__loadLibrary__(window)
+            elif self.__event__ == "library_progress":
+                index, status = self.__values__[self.__event__]
+                ## Chunks of a listing which has since been replaced are ignored
+                if index is self.__library__:
+                    self.__browserResults__ = index.search(self.__browserQuery__)
+                    self.__refreshBrowser__(window)
+                    window["browser_status"].update(status)
+            elif self.__event__ == "browser_search":
+                query = self.__values__.get("browser_search", "")
+                if self.__library__:
+                    ## A query narrowing the previous one only needs to filter its results
+                    narrows = query_narrows(self.__browserQuery__, query)
+                    self.__browserResults__ = self.__library__.search(query, within=self.__browserResults__ if narrows else None)
+                    self.__browserOffset__ = 0
+                    self.__refreshBrowser__(window)
+                self.__browserQuery__ = query
+            elif self.__event__ in ["browser_scroll", "browser_rows-wheel", "browser_rows-up", "browser_rows-down"]:
+                if self.__event__ == "browser_scroll":
+                    offset = int(self.__values__.get("browser_scroll", 0))
+                elif self.__event__ == "browser_rows-wheel":
+                    offset = self.__browserOffset__ - (3 if window["browser_rows"].user_bind_event.delta > 0 else -3)
+                else:
+                    offset = self.__browserOffset__ + (3 if self.__event__ == "browser_rows-down" else -3)
+                self.__browserOffset__ = max(min(offset, len(self.__browserResults__) - BROWSER_ROWS), 0)
+                self.__refreshBrowser__(window)
+            elif self.__event__ in ["browser_play", "browser_rows"]:
+                ## Double click or return on a row, or the play button
+                rows = window["browser_rows"].get_indexes()
+                if rows and self.__connection__ and self.__browserOffset__ + rows[0] < len(self.__browserResults__):
+                    track = self.__library__.track(self.__browserResults__[self.__browserOffset__ + rows[0]])
+                    self.__dispatcher__.submit("play_track", track[4])
+            elif self.__event__ == "volume_control-update":
                 ## Changing volume does not trigger any actions for other events
                 self.__updatePlaybackVolume__(int(self.__values__.get("volume_control", self.__playbackVolume__)))
-            elif self.__event__ == "refresh_metadata":
-                self.__updateRemoteHost__(self.__values__.get("remote_address", f"{self.__remoteHostUser__}@{self.__remoteHost__}:{self.__remoteHostPort__}"))
-                self.__fetchMetadata__(include_volume=True, include_play_state=True)
-                ## Update playback information
-                window["current_title"].update(self.__metadata__.get("title", "Unknown Track"))
-                window["current_artist"].update(self.__metadata__.get("artist", "Unknown Track"))
-                window["current_album"].update(self.__metadata__.get("album", "Unknown Track"))
-                window["current_image"].update(self.__metadata__.get("image", "Unknown Track"))
-                window["volume_control"].update(self.__playbackVolume__)
+            elif self.__event__ in ["refresh_metadata", "remote_address"]:
+                self.__updateRemoteHost__(self.__values__.get("remote_address", host_key(self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__)))
+                ## Playback information is updated once the fetch is acknowledged
+                self.__sendCommand__("refresh")
+            elif self.__event__ == "group_pause":
+                self.__sendGroupCommand__("pause")
+            elif self.__event__ == "group_volume":
+                self.__sendGroupCommand__("volume", int(self.__values__.get("volume_control", self.__playbackVolume__)))
             elif self.__event__ == "repeat_toggle":
                 if self.__repeatState__ == "playlist":
                     self.__repeatState__ = "track"
@@ -190,127 +1283,455 @@ class controller:
                 else:
                     self.__repeatState__ = "playlist"
                 ## Update repeat button to appropriate unicode
-                window["repeat_toggle"].update(self.__unicode_symbols__[f"repeat_{self.__repeatState__.lower()}"])
-                window["repeat_toggle"].set_tooltip(f"Repeat: {self.__repeatState__.capitalize()}")
+                self.__refreshWindow__(window)
                 self.__updateRepeatState__()
             elif self.__event__ == "shuffle_toggle":
                 self.__shuffleState__ = not self.__shuffleState__
                 ## Update shuffle tooltip indicator
-                window["shuffle_toggle"].set_tooltip(f"Shuffle: {str(self.__shuffleState__).replace('True', 'On').replace('False', 'Off')}")
+                self.__refreshWindow__(window)
                 self.__sendCommand__(self.__event__)
             elif self.__event__ == "play_pause":
                 ## Events parsed by __sendCommand__ function
                 self.__sendCommand__(self.__event__)
-                ## Only the play/pause state is retrieved to verify command succeeded
-                self.__fetchMetadata__(include_play_state=True, only_includes=True)
-                ## Invert play/pause button color scheme
-                # TODO: Fix broken highlight color
-                if self.__playState__.lower().strip() == "paused":
-                    # window["play_pause"].Widget.config(highlightcolor="black")
-                    window["play_pause"].update(button_color=("black", "white"))
-                else:
-                    # window["play_pause"].Widget.config(highlightcolor="white")
-                    window["play_pause"].update(button_color=("white", "black"))
+                ## Invert play/pause button optimistically, the acknowledgement confirms it
+                self.__playState__ = "paused" if self.__playState__.lower().strip() == "playing" else "playing"
+                self.__clock__.sync(playing=self.__playState__ == "playing")
+                self.__refreshWindow__(window)
             elif self.__event__:
                 self.__sendCommand__(self.__event__)
-                self.__fetchMetadata__()
-                window["current_title"].update(self.__metadata__.get("title", "Unknown Track"))
-                window["current_artist"].update(self.__metadata__.get("artist", "Unknown Track"))
-                window["current_album"].update(self.__metadata__.get("album", "Unknown Track"))
-                window["current_image"].update(self.__metadata__.get("image", "Unknown Track"))
+                if self.__event__ in ["seek_back", "seek_forward"]:
+                    self.__updateProgress__(window)
+        self.__dispatcher__.stop()
+        self.__stopFollower__()
         window.close()
-        self.__session__.close()
+
+    def __refreshWindow__(self, window):
+        ## Only widgets whose value differs from the last one shown are updated
+        changed = snapshot_diff(self.__shown__, {
+            "title": self.__metadata__.get("title", "Unknown Track"),
+            "artist": self.__metadata__.get("artist", "Unknown Artist"),
+            "album": self.__metadata__.get("album", "Unknown Album"),
+            "image": self.__metadata__.get("image", "default.png"),
+            "volume": self.__playbackVolume__,
+            "shuffle": self.__shuffleState__,
+            "repeat": self.__repeatState__.lower(),
+            "paused": self.__playState__.lower().strip() == "paused"
+        })
+        self.__shown__.update(changed)
+
+        ## Update playback information
+        for field in ["title", "artist", "album"]:
+            if field in changed:
+                window[f"current_{field}"].update(changed[field])
+        if "image" in changed:
+            window["current_image"].update(data=self.__decodeImage__(changed["image"]))
+        if "volume" in changed:
+            window["volume_control"].update(changed["volume"])
+        if "shuffle" in changed:
+            window["shuffle_toggle"].set_tooltip(f"Shuffle: {str(changed['shuffle']).replace('True', 'On').replace('False', 'Off')}")
+        if "repeat" in changed:
+            window["repeat_toggle"].update(self.__unicode_symbols__[f"repeat_{changed['repeat']}"])
+            window["repeat_toggle"].set_tooltip(f"Repeat: {changed['repeat'].capitalize()}")
+        if "paused" in changed:
+            self.__updatePlayButton__(window)
+        self.__updateProgress__(window)
+
+    def __decodeImage__(self, path):
+        ## Decoded images stay in memory, so showing known artwork again costs no disk read or decode
+        if path in self.__images__:
+            self.__images__.move_to_end(path)
+            return self.__images__[path]
+        try:
+            image = gui.tk.PhotoImage(file=path)
+        except gui.tk.TclError:
+            ## Unreadable artwork falls back to the default image
+            return self.__decodeImage__("default.png") if path != "default.png" else None
+        self.__images__[path] = image
+        if len(self.__images__) > IMAGE_CACHE_SIZE:
+            self.__images__.popitem(last=False)
+        return image
+
+    def __updateProgress__(self, window):
+        ## Widgets are only touched when the displayed second changes
+        position, length = self.__clock__.position(), self.__clock__.length()
+        elapsed, remaining = format_duration(position), f"-{format_duration(length - position)}" if length else ""
+        if (elapsed, remaining) == self.__progressText__:
+            return
+        self.__progressText__ = (elapsed, remaining)
+        window["elapsed_time"].update(elapsed)
+        window["remaining_time"].update(remaining)
+        if not self.__seeking__:
+            window["progress"].update(int(position / length * 1000) if length else 0)
+
+    def __loadLibrary__(self, window):
+        if not self.__connection__:
+            return
+        self.__library__, self.__browserResults__, self.__browserOffset__ = libraryIndex(), [], 0
+        self.__refreshBrowser__(window)
+        window["browser_status"].update("Loading...")
+        self.__hostExecutor__.submit(self.__streamLibrary__, window, self.__library__, self.__values__.get("browser_source") or next(iter(BROWSER_SOURCES[self.__mode__])), self.__connection__)
+
+    def __streamLibrary__(self, window, index, source, connection):
+        ## Runs on the host executor, handing the window each indexed chunk as "library_progress"
+        def add(tracks):
+            index.add(tracks)
+            window.write_event_value("library_progress", (index, f"Loading... {len(index)} tracks"))
+
+        try:
+            if self.__mode__ == "agent":
+                connection["agent"].request(BROWSER_SOURCES["agent"][source], timeout=300, on_chunk=add)
+            else:
+                ## A listing of its own, so playback commands are not queued behind it
+                listing = cmusClient(connection["host"], connection["port"], self.__remoteHostPassword__,
+                    connect=lambda: self.__openSocket__(connection["host"], connection["port"]))
+                try:
+                    chunk = []
+                    for track in parse_cmus_library(listing.stream(BROWSER_SOURCES["cmus"][source])):
+                        chunk.append(track)
+                        if len(chunk) == LIBRARY_CHUNK:
+                            add(chunk)
+                            chunk = []
+                            ## Stop streaming once another listing replaced this one
+                            if index is not self.__library__:
+                                return
+                    add(chunk)
+                finally:
+                    listing.close()
+            window.write_event_value("library_progress", (index, f"{len(index)} tracks"))
+        except Exception as e:
+            window.write_event_value("library_progress", (index, f"Failed to load {source.lower()}: {e}"))
+
+    def __refreshBrowser__(self, window):
+        ## Only the visible slice of results is formatted and handed to the row widgets
+        visible = self.__browserResults__[self.__browserOffset__:self.__browserOffset__ + BROWSER_ROWS]
+        rows = []
+        for position in visible:
+            title, artist, album, length, locator = self.__library__.track(position)
+            rows.append(f"{title[:30]:<30} {artist[:22]:<22} {format_duration(length):>8}")
+        window["browser_rows"].update(values=rows)
+        window["browser_scroll"].update(range=(0, max(len(self.__browserResults__) - BROWSER_ROWS, 0)), value=self.__browserOffset__)
+
+    def __agentEvent__(self, connection, state):
+        ## Pushed from the agent reader thread whenever the remote state changes
+        if not self.__window__ or self.__closing__ or connection is not self.__connection__:
+            return
+        ## Artwork may take an SFTP transfer and a magick run, which would hold up the reader
+        ## (and every request waiting on it), so it is resolved on the executor instead
+        self.__agentEvents__ += 1
+        self.__hostExecutor__.submit(self.__postAgentEvent__, connection, mediaMetadata(**state), self.__agentEvents__)
+
+    def __postAgentEvent__(self, connection, record, sequence):
+        self.__resolveArtwork__(record, connection=connection)
+        ## A newer event overtaking this one while its artwork was fetched makes it stale
+        if sequence == self.__agentEvents__ and connection is self.__connection__:
+            self.__window__.write_event_value("metadata_update", record)
+
+    def __showConnectionState__(self, window):
+        state = self.__connection__["state"]
+        window["connection_state"].update(text_color=CONNECTION_STATE_COLORS[state])
+        window["connection_state"].set_tooltip(state.capitalize())
+
+    def __updatePlayButton__(self, window):
+        ## Invert play/pause button color scheme
+        # TODO: Fix broken highlight color
+        if self.__playState__.lower().strip() == "paused":
+            # window["play_pause"].Widget.config(highlightcolor="black")
+            window["play_pause"].update(button_color=("black", "white"))
+        else:
+            # window["play_pause"].Widget.config(highlightcolor="white")
+            window["play_pause"].update(button_color=("white", "black"))
+
+    def __followCommand__(self):
+        ## One shell runs every follower, each line tagged with its source
+        ## and tab-separated so the reader can tell the streams apart;
+        ## metadata lines carry the same record format as __fetchMetadata__
+        return (
+            f"playerctl --follow metadata --format 'metadata\t{TRACK_FORMAT}' & "
+            f"playerctl --follow status --format 'status\t{{{{status}}}}{FIELD_SEPARATOR}{{{{position}}}}' & "
+            "pactl subscribe | while read -r event; do "
+            "case \"$event\" in *' on sink '*) printf 'volume\t%s\n' \"$(pactl get-sink-volume @DEFAULT_SINK@)\";; esac; "
+            "done & wait"
+        )
+
+    def __startFollower__(self, window):
+        ## Follow stream is only available through playerctl over SSH
+        if not self.__follow__ or self.__mode__ not in ["ssh", "playerctl"] or self.__connection__["state"] != "connected":
+            return
+
+        self.__followChannel__ = self.__connection__["session"].get_transport().open_session()
+        ## A PTY ensures remote followers are hung up when the channel closes
+        self.__followChannel__.get_pty()
+        self.__followChannel__.exec_command(self.__followCommand__())
+        threading.Thread(target=self.__followReader__, args=(window, self.__followChannel__), daemon=True).start()
+
+    def __stopFollower__(self):
+        if self.__followChannel__:
+            self.__followChannel__.close()
+            self.__followChannel__ = None
+
+    def __followReader__(self, window, channel):
+        for line in channel.makefile("r"):
+            source, _, payload = line.rstrip("\r\n").partition("\t")
+            update = {}
+            if source == "metadata":
+                try:
+                    record = parse_metadata(payload)
+                except ValueError:
+                    continue
+                update["title"] = record.title or "Unknown Track"
+                update["artist"] = record.artist or "Unknown Artist"
+                update["album"] = record.album or "Unknown Album"
+                ## Artwork is transferred here, keeping SFTP off the GUI thread
+                update["image"] = self.__fetchArtwork__(record.art_url, connection=self.__connection__) if record.art_url else "default.png"
+                update["position"], update["length"] = record.position, record.length
+            elif source == "status":
+                status, _, position = payload.partition(FIELD_SEPARATOR)
+                update["play_state"] = status.lower()
+                update["position"] = int(position) / 1000000 if position.isdigit() else None
+            elif source == "volume":
+                update["volume"] = parse_volume(payload)
+            else:
+                continue
+            window.write_event_value("follow_update", update)
+        ## Channel closed by remote host or by __stopFollower__
+        channel.close()
+
+    def __applyFollowUpdate__(self, window, update):
+        if "play_state" in update:
+            self.__playState__ = update["play_state"]
+        if update.get("volume") is not None:
+            self.__playbackVolume__ = update["volume"]
+        for field in ["title", "artist", "album", "image"]:
+            if field in update:
+                self.__metadata__[field] = update[field]
+        ## Each follow event carries the position it happened at
+        if update.get("position") is not None:
+            self.__nextSync__ = time.monotonic() + DRIFT_CHECK_INTERVAL
+        self.__clock__.sync(position=update.get("position"), length=update.get("length"),
+            playing=update["play_state"] == "playing" if "play_state" in update else None)
+        self.__refreshWindow__(window)
 
     def __updateRepeatState__(self):
-        # TODO: Add repeat controls for CMUS
-        if self.__mode__ == "cmus":
-            pass
-        elif self.__mode__ in ["ssh", "playerctl"]:
-            self.__commandProcessor__(f"playerctl loop {self.__repeatState__}")
+        if self.__connection__:
+            self.__dispatcher__.submit("loop", self.__repeatState__)
 
     def __updateRemoteHost__(self, remoteAddress):
-        user, address = remoteAddress.split("@")
-        host, port = address.split(":")
+        try:
+            user, host, port = parse_remote_address(remoteAddress)
+        except ValueError as e:
+            print(e)
+            return
+        port = port or self.__remoteHostPort__
 
-        if not host:
+        if not host or not self.__connection__:
             return
 
-        if self.ipv4_pattern.match(host):
-            if self.__remoteHost__ != host:
-                self.__getIPcontrolLock__(release=True)
-                self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__ = user, host, port
-                self.__getIPcontrolLock__()
-                if self.__mode__ in ["ssh", "playerctl"]:
-                    self.__session__.close()
-                    self.__getSSHSession__()
+        if is_ip_address(host) or self.hostname_pattern.fullmatch(host):
+            key = host_key(user, host, port)
+            if key in self.__hostPool__:
+                self.__switchHost__(user, host, port)
+            elif key not in self.__pendingHosts__:
+                ## New hosts connect on the executor, the window stays responsive meanwhile
+                self.__pendingHosts__.add(key)
+                self.__hostExecutor__.submit(self.__addHost__, user, host, port)
 
-        # TODO: Add IPv6 support
+    def __addHost__(self, user, host, port):
+        ## Reports back as "host_connected" or "host_failed", see __openWindow__
+        try:
+            self.__connectHosts__([(user, host, port)])
+        except Exception as e:
+            self.__window__.write_event_value("host_failed", ((user, host, port), e))
+        else:
+            self.__window__.write_event_value("host_connected", (user, host, port))
+
+    def __switchHost__(self, user, host, port):
+        ## Pooled connections are already warm, so switching is immediate
+        connection = self.__hostPool__[host_key(user, host, port)]
+        if self.__connection__ is not connection:
+            self.__stopFollower__()
+            self.__remoteHostUser__, self.__remoteHost__, self.__remoteHostPort__ = user, host, port
+            self.__connection__ = connection
+            self.__showConnectionState__(self.__window__)
+            self.__startFollower__(self.__window__)
 
     def __updatePlaybackVolume__(self, volume):
-        if not self.__remoteHost__:
+        if not self.__remoteHost__ or not self.__connection__:
             return
         elif int(str(volume).replace("%", "")) not in range(0,101):
             print("Invalid volume!")
             return
 
         self.__playbackVolume__ = volume
-
-        if self.__mode__ == "cmus":
-            self.__commandProcessor__(f"-v {volume}%")
-        ## SSH or playerctl accepted as modes
-        elif self.__mode__ in ["ssh", "playerctl"]:
-            self.__commandProcessor__(f"pactl set-sink-volume @DEFAULT_SINK@ {volume}%")
+        self.__dispatcher__.submit("volume", volume)
 
     def __commandProcessor__(self, command, **kwargs):
         strip_output = kwargs.get("strip", True)
+        connection = kwargs.get("connection", self.__connection__)
+        ## Name the command is recorded under in latency statistics
+        label = kwargs.get("label", command.split(" ")[0])
         if self.__mode__ == "cmus":
-            result = [subprocess.Popen(f"cmus-remote --server {self.__remoteHost__}:{self.__remoteHostPort__} --passwd {self.__remoteHostPassword__} {command}", stdout=subprocess.PIPE, shell=True).communicate()[0].decode()]
+            started = time.perf_counter()
+            result = ["\n".join(connection["cmus"].command(command))]
+            self.__stats__.record(label, complete=(time.perf_counter() - started) * 1000)
         elif self.__mode__ in ["ssh", "playerctl"]:
-            raw = self.__session__.exec_command(command)
+            raw = self.__execRemote__(connection, command, label)
             result = [
                 ## STDOUT
-                raw[1].read().decode("utf8").strip() if strip_output else raw[1].read().decode("utf8"),
+                raw[0].decode("utf8").strip() if strip_output else raw[0].decode("utf8"),
                 ## STDERR
-                raw[2].read().decode("utf8").strip() if strip_output else raw[2].read().decode("utf8")
+                raw[1].decode("utf8").strip() if strip_output else raw[1].decode("utf8")
             ]
         return result
 
+    def __execRemote__(self, connection, command, label):
+        ## exec_command split into its stages, so each one can be timed
+        started = time.perf_counter()
+        transport = connection["session"].get_transport()
+        if not transport or not transport.is_active():
+            raise SSHException("SSH session not active")
+        ## A dead link raises a timeout here, instead of blocking the dispatcher indefinitely
+        channel = transport.open_session(timeout=COMMAND_TIMEOUT)
+        channel.settimeout(COMMAND_TIMEOUT)
+        opened = time.perf_counter()
+        channel.exec_command(command)
+        executed = time.perf_counter()
+        stdout, stderr = channel.makefile("rb"), channel.makefile_stderr("rb")
+        output = stdout.read(1)
+        first_byte = time.perf_counter()
+        output += stdout.read()
+        errors = stderr.read()
+        channel.close()
+        completed = time.perf_counter()
+        self.__stats__.record(label,
+            channel_open=(opened - started) * 1000,
+            exec=(executed - started) * 1000,
+            first_byte=(first_byte - started) * 1000,
+            complete=(completed - started) * 1000
+        )
+        return output, errors
+
     def __sendCommand__(self, command):
-        if not self.__remoteHost__:
+        ## Input is ignored until the background startup has connected
+        if not self.__remoteHost__ or not self.__connection__:
             return
 
-        ## Commands initialized for SSH/playerctl, replaced when using CMUS
-        if command == "play_pause":
-            if self.__mode__ == "cmus":
-                command = "-u"
-            elif self.__mode__ in ["ssh", "playerctl"]:
-                command = command.replace("_", "-")
-        elif command == "previous":
-            if self.__mode__ == "cmus":
-                command = "-r"
-        elif command == "next":
-            if self.__mode__ == "cmus":
-                command = "-n"
-        elif command == "seek_back":
-            command = f"position {self.__seekDuration__}"
-            if self.__mode__ == "cmus":
-                command = command.replace("position ", "-k -")
-            else:
-                command += "-"
-        elif command == "seek_forward":
-            command = f"position {self.__seekDuration__}"
-            if self.__mode__ == "cmus":
-                command = command.replace("position ", "-k +")
-            else:
-                command += "+"
+        ## GUI events are queued as (operation, value) pairs for the dispatcher
+        if command in ["play_pause", "shuffle_toggle", "refresh"]:
+            self.__dispatcher__.submit(command)
+        elif command in ["previous", "next"]:
+            self.__dispatcher__.submit(command, 1)
+        elif command in ["seek_back", "seek_forward"]:
+            offset = self.__seekDuration__ if command == "seek_forward" else -self.__seekDuration__
+            self.__dispatcher__.submit("seek", offset)
+            ## Move the progress bar optimistically, the acknowledgement confirms it
+            self.__clock__.seek(offset)
         ## Additional commands go here
-        elif command == "shuffle_toggle":
-            if self.__mode__ == "cmus":
-                command = "-S"
-            else:
-                command = command.replace("_", " ")
-        result = self.__commandProcessor__(command if self.__mode__ == "cmus" else f"playerctl {command}")
-        return result
+
+    def __sendGroupCommand__(self, operation, value=None):
+        ## Every pooled host runs concurrently, so latency is that of the slowest host
+        if not self.__connection__:
+            return
+        for key, connection in self.__hostPool__.items():
+            future = self.__hostExecutor__.submit(self.__executeOperations__, [(operation, value)], connection=connection)
+            future.add_done_callback(lambda future, key=key: future.exception() and print(f"Group command failed on {key}: {future.exception()}"))
+            if connection is self.__connection__:
+                ## The window reconciles against the current host only
+                future.add_done_callback(lambda future: self.__window__.write_event_value("command_ack", None if future.exception() else future.result()))
+
+    def __operationCommand__(self, operation, value):
+        ## Commands initialized for SSH/playerctl, replaced by cmus protocol commands
+        if operation == "play_pause":
+            command = "player-pause" if self.__mode__ == "cmus" else "playerctl play-pause"
+        elif operation == "pause":
+            command = "player-pause-playback" if self.__mode__ == "cmus" else "playerctl pause"
+        elif operation == "previous":
+            command = "player-prev" if self.__mode__ == "cmus" else "playerctl previous"
+        elif operation == "next":
+            command = "player-next" if self.__mode__ == "cmus" else "playerctl next"
+        elif operation == "seek":
+            if value == 0:
+                return []
+            command = f"seek {value:+d}" if self.__mode__ == "cmus" else f"playerctl position {abs(value)}{'+' if value > 0 else '-'}"
+        elif operation == "position":
+            ## Absolute seek, in whole seconds
+            command = f"seek {int(value)}" if self.__mode__ == "cmus" else f"playerctl position {int(value)}"
+        elif operation == "shuffle_toggle":
+            command = "toggle shuffle" if self.__mode__ == "cmus" else "playerctl shuffle toggle"
+        elif operation == "volume":
+            command = f"vol {value}%" if self.__mode__ == "cmus" else f"pactl set-sink-volume @DEFAULT_SINK@ {value}%"
+        elif operation == "play_track":
+            ## Only cmus and the agent can list tracks, see BROWSER_SOURCES
+            if self.__mode__ != "cmus":
+                return []
+            command = f"player-play {value}"
+        elif operation == "loop":
+            if self.__mode__ != "cmus":
+                return [f"playerctl loop {value.capitalize()}"]
+            ## cmus splits repeat into playlist (repeat) and track (repeat_current)
+            if value == "track":
+                return ["set repeat_current=true"]
+            return ["set repeat_current=false", f"set repeat={str(value == 'playlist').lower()}"]
+        else:
+            return []
+        ## Batched skips are repeated within the same invocation
+        return [command] * (value if operation in ["previous", "next"] else 1)
+
+    def __executeOperations__(self, operations, **kwargs):
+        ## Runs on the dispatcher or host executor threads, so no GUI state may be touched here;
+        ## returns None when the connection is down, queueing what REPLAY_WINDOW allows
+        connection = kwargs.get("connection", self.__connection__)
+        if connection["state"] == "connected":
+            try:
+                return self.__performOperations__(operations, connection)
+            except connection_errors as e:
+                print(f"Lost connection to {host_key(connection['user'], connection['host'], connection['port'])}: {e}")
+                self.__reconnect__(connection)
+
+        queued = time.monotonic()
+        with connection["state_lock"]:
+            for operation, value in operations:
+                if operation in REPLAY_WINDOW:
+                    ## Every replayed operation only needs its latest value
+                    connection["backlog"] = [pending for pending in connection["backlog"] if pending[0] != operation] + [(operation, value, queued)]
+        return None
+
+    def __performOperations__(self, operations, connection):
+        if self.__mode__ == "agent":
+            ## Every agent response carries the resulting state
+            state = None
+            for operation, value in operations:
+                if operation != "refresh":
+                    started = time.perf_counter()
+                    state = connection["agent"].request(operation, value)
+                    self.__stats__.record(operation, complete=(time.perf_counter() - started) * 1000)
+            if not state:
+                started = time.perf_counter()
+                state = connection["agent"].request("state")
+                self.__stats__.record("refresh", complete=(time.perf_counter() - started) * 1000)
+            record = mediaMetadata(**state)
+            self.__resolveArtwork__(record, connection=connection)
+            return record
+
+        commands = [command for operation, value in operations for command in self.__operationCommand__(operation, value)]
+        if self.__mode__ == "cmus":
+            for command in commands:
+                self.__commandProcessor__(command, connection=connection)
+            return parse_cmus_status(self.__commandProcessor__("status", connection=connection)[0].split("\n"))
+
+        ## Commands and the reconciling fetch share a single round trip
+        command = metadata_command(volume=True, play_state=True, playback_controls=True, track=True)
+        if any(operation in ["next", "previous"] for operation, value in operations):
+            command = skip_settle_command(commands, command)
+        elif commands:
+            command = f"{{ {'; '.join(commands)}; }} >/dev/null 2>&1; {command}"
+        ## Coalesced batches share one label, so each histogram keeps describing a single kind of
+        ## round trip; how many operations went into a batch is sampled as its "operations" stage
+        label = operations[0][0] if len(operations) == 1 else "batch"
+        if len(operations) > 1:
+            self.__stats__.record("batch", operations=len(operations))
+        record = parse_metadata(self.__commandProcessor__(command, strip=False, connection=connection, label=label)[0])
+        self.__resolveArtwork__(record, connection=connection)
+        return record
 
     def __fetchMetadata__(self, **kwargs):
         ## Load fetch options
@@ -319,55 +1740,356 @@ class controller:
         include_playback_controls = kwargs.get("include_playback_controls", False)
         only_includes = kwargs.get("only_includes", False)
 
-        ## Create default metadata set
-        self.__metadata__ = {"title": "Unknown Track", "artist": "Unknown Artist", "album": "Unknown Album", "image": "default.png"}
-
-        if self.__mode__ in ["ssh", "playerctl"]:
-            ## Run include conditions first, to allow for clean exit
-            ## with only_includes
-            if include_volume:
-                new_volume = self.__commandProcessor__("pactl get-sink-volume @DEFAULT_SINK@")[0].split("%")[0].split(" ")[-1]
-                if new_volume:
-                    self.__playbackVolume__ = new_volume
-            if include_play_state:
-                self.__playState__ = self.__commandProcessor__("playerctl status")[0].lower()
-            if include_playback_controls:
-                self.__repeatState__, self.__shuffleState__ = self.__commandProcessor__("playerctl loop; playerctl shuffle", strip=False)[0].split("\n")[:-1]
-                self.__shuffleState__ = True if self.__shuffleState__ == "On" else False
-            ## Do not make SSH requests if not required
-            if not only_includes:
-                metadata = self.__commandProcessor__("playerctl metadata")[0]
-                # Parse standard metadata set from playerctl
-                for line in metadata.split("\n"):
-                    if "xesam:artist" in line:
-                        self.__metadata__["artist"] = line.split("xesam:artist")[1].strip()
-                    elif "xesam:album" in line:
-                        self.__metadata__["album"] = line.split("xesam:album")[1].strip()
-                    elif "xesam:title" in line:
-                        self.__metadata__["title"] = line.split("xesam:title")[1].strip()
-                    elif "mpris:artUrl" in line:
-                        # NOTE: Most artwork files are placed in ~/.cache
-                        # NOTE: VLC, and some other media players use non-standard
-                        # NOTE: filepaths, which cannot be understood by SCP. The
-                        # NOTE: default.png is used in such cases
-                        remoteImage = line.split("mpris:artUrl")[1].split("file://")[1].replace("%20", " ").strip()
-                        ## Images placed in /tmp directory to avoid bloat
-                        self.__metadata__["image"] = f"/tmp/user/1000/{hashlib.sha256(os.path.basename(remoteImage).encode()).hexdigest()}.png".strip()
-
-                        ## Relying on stored artwork versions averts unneeded file transfers
-                        if not os.path.exists(self.__metadata__["image"]):
-                            file_transfer = self.__session__.open_sftp()
-                            file_transfer.get(remoteImage, self.__metadata__['image'])
-                            ## If SFTP fails, use default image
-                            if not os.path.exists(self.__metadata__["image"]):
-                                self.__metadata__["image"] = "default.png"
-                            file_transfer.close()
+        if self.__mode__ == "agent":
+            ## The agent always reports its full state
+            record = mediaMetadata(**self.__connection__["agent"].request("state"))
+            self.__resolveArtwork__(record)
+            self.__applyMetadataRecord__(record)
+        elif self.__mode__ == "cmus":
+            ## cmus reports everything with a single status command
+            self.__applyMetadataRecord__(parse_cmus_status(self.__commandProcessor__("status")[0].split("\n")))
+        elif self.__mode__ in ["ssh", "playerctl"]:
+            ## Every requested field is gathered by a single remote invocation
+            command = metadata_command(
+                volume=include_volume,
+                play_state=include_play_state,
+                playback_controls=include_playback_controls,
+                track=not only_includes
+            )
+            record = parse_metadata(self.__commandProcessor__(command, strip=False, label="refresh")[0])
+            self.__resolveArtwork__(record)
+            self.__applyMetadataRecord__(record)
+
+    def __applyMetadataRecord__(self, record):
+        ## Fields left as None were not requested in the fetch
+        if record.volume is not None:
+            self.__playbackVolume__ = record.volume
+        if record.status is not None:
+            self.__playState__ = record.status
+        if record.loop in ["playlist", "track", "none"]:
+            self.__repeatState__ = record.loop
+        if record.shuffle is not None:
+            self.__shuffleState__ = record.shuffle
+        if record.position is not None:
+            self.__nextSync__ = time.monotonic() + DRIFT_CHECK_INTERVAL
+        self.__clock__.sync(position=record.position, length=record.length, rate=record.rate,
+            playing=record.status == "playing" if record.status is not None else None)
+        if record.title is not None:
+            self.__metadata__["title"] = record.title or "Unknown Track"
+            self.__metadata__["artist"] = record.artist or "Unknown Artist"
+            self.__metadata__["album"] = record.album or "Unknown Album"
+            self.__metadata__["image"] = record.image or "default.png"
+        elif record.status is not None and record.status not in ["playing", "paused"]:
+            ## A stopped or absent player has no track to show
+            self.__metadata__ = {"title": "Unknown Track", "artist": "Unknown Artist", "album": "Unknown Album", "image": "default.png"}
+
+    def __resolveArtwork__(self, record, **kwargs):
+        ## Artwork is fetched wherever the record was parsed, ahead of the GUI
+        if record.art_url:
+            record.image = self.__fetchArtwork__(record.art_url, **kwargs)
+
+    def __fetchArtwork__(self, artUrl, **kwargs):
+        # NOTE: Most artwork files are placed in ~/.cache
+        # NOTE: VLC, and some other media players use non-standard
+        # NOTE: filepaths, which cannot be understood by SCP. The
+        # NOTE: default.png is used in such cases
+        connection = kwargs.get("connection", self.__connection__)
+        if not artUrl.startswith("file://") or not connection["session"]:
+            return "default.png"
+        remoteImage = unquote(urlparse(artUrl).path)
+
+        try:
+            with connection["sftp_lock"]:
+                if not connection["sftp"] or connection["sftp"].sock.closed:
+                    connection["sftp"] = self.__openSFTP__(connection)
+                ## Keyed on size and mtime as well, so replaced artwork is fetched again
+                attributes = connection["sftp"].stat(remoteImage)
+                key = self.__artCache__.key(remoteImage, attributes.st_size, attributes.st_mtime, *THUMBNAIL_SIZE)
+                ## Artwork which failed before is not transferred again on every track change
+                if self.__artCache__.failed(key):
+                    return "default.png"
+
+                ## Relying on stored artwork versions averts unneeded file transfers
+                try:
+                    return self.__artCache__.lookup(key) or self.__artCache__.store(key, lambda path: self.__thumbnailArtwork__(connection, remoteImage, path, attributes.st_size))
+                except artwork_errors:
+                    ## Unless the link dropped mid transfer, the same artwork would fail again
+                    if connection["session"].get_transport().is_active():
+                        self.__artCache__.fail(key)
+                    raise
+        except artwork_errors:
+            ## If SFTP fails, use default image
+            return "default.png"
+
+    def __thumbnailArtwork__(self, connection, remoteImage, path, size):
+        ## Prefer scaling on the remote host, so only a small PNG crosses the wire; hosts found
+        ## without ImageMagick go straight to the transfer, rather than spending a round trip on each miss
+        if connection["thumbnailer"] is not False:
+            width, height = THUMBNAIL_SIZE
+            source = quote(f"{remoteImage}[0]")
+            started = time.perf_counter()
+            thumbnail, errors = self.__execRemote__(connection,
+                f"if command -v magick >/dev/null; then magick {source} -thumbnail {width}x{height} png:-; "
+                f"elif command -v convert >/dev/null; then convert {source} -thumbnail {width}x{height} png:-; "
+                f"else echo 'no thumbnailer' >&2; fi",
+                "art_thumbnail"
+            )
+            self.__stats__.record("art_thumbnail", bytes_per_second=len(thumbnail) / max(time.perf_counter() - started, 1e-6))
+            connection["thumbnailer"] = b"no thumbnailer" not in errors
+            if thumbnail.startswith(PNG_SIGNATURE):
+                with open(path, "wb") as thumbnail_file:
+                    thumbnail_file.write(thumbnail)
+                return
+
+        ## Otherwise transfer the original and scale it locally
+        started = time.perf_counter()
+        ## Reads are pipelined up to the profile's limit; the size is known from the cache lookup's stat
+        with connection["sftp"].open(remoteImage, "rb") as remote_file:
+            remote_file.prefetch(size, max_concurrent_requests=self.__linkProfile__["sftp_requests"])
+            with open(path, "wb") as image_file:
+                shutil.copyfileobj(remote_file, image_file, 32768)
+        elapsed = time.perf_counter() - started
+        self.__stats__.record("art_sftp", complete=elapsed * 1000, bytes_per_second=size / max(elapsed, 1e-6))
+        if pillow:
+            with pillow.open(path) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                if image.mode not in PNG_MODES:
+                    image = image.convert("RGBA" if "A" in image.mode else "RGB")
+                image.save(path, "PNG")
+        else:
+            with open(path, "rb") as image_file:
+                ## Without Pillow only artwork Tk can decode is usable
+                if not image_file.read(8).startswith((PNG_SIGNATURE, b"GIF8")):
+                    raise ValueError(f"Cannot display {remoteImage} without Pillow installed")
 
     def __generateCopyrightElement__(self):
         ## Create one-time copyright element
         layout=[gui.Text(f"remote-media-controller {self.__version__.strip()} (C) le-firehawk 2023", font="Courier 6")]
         return layout
 
+def metadata_command(**kwargs):
+    ## Build one remote invocation emitting a record for each requested field
+    command = []
+    if kwargs.get("volume", False):
+        command.append(f"printf 'volume{FIELD_SEPARATOR}%s{RECORD_SEPARATOR}' \"$(pactl get-sink-volume @DEFAULT_SINK@)\"")
+    if kwargs.get("play_state", False):
+        command.append(f"printf 'status{FIELD_SEPARATOR}%s{RECORD_SEPARATOR}' \"$(playerctl status)\"")
+    if kwargs.get("playback_controls", False):
+        command.append(f"printf 'loop{FIELD_SEPARATOR}%s{RECORD_SEPARATOR}' \"$(playerctl loop)\"")
+        command.append(f"printf 'shuffle{FIELD_SEPARATOR}%s{RECORD_SEPARATOR}' \"$(playerctl shuffle)\"")
+    if kwargs.get("track", False):
+        command.append(f"playerctl metadata --format '{TRACK_FORMAT}'")
+    return "; ".join(command)
+
+def skip_settle_command(commands, fetch):
+    ## Run commands including a skip, then fetch once the player reports another track
+    ## (or after SKIP_SETTLE_ATTEMPTS polls, e.g. when skipping past the end of the playlist)
+    current = "playerctl metadata --format '{{ mpris:trackid }} {{ xesam:title }}' 2>/dev/null"
+    return (f"before=\"$({current})\"; {{ {'; '.join(commands)}; }} >/dev/null 2>&1; "
+        f"for attempt in $(seq {SKIP_SETTLE_ATTEMPTS}); do [ \"$({current})\" != \"$before\" ] && break; sleep {SKIP_SETTLE_DELAY}; done; {fetch}")
+
+def snapshot_diff(previous, current):
+    ## Fields of current whose value differs from (or is missing in) previous
+    return {field: value for field, value in current.items() if field not in previous or previous[field] != value}
+
+def format_duration(seconds):
+    ## 75 -> "1:15", 3675 -> "1:01:15"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def parse_volume(output):
+    ## pactl reports e.g. "Volume: front-left: 65536 / 100% / 0.00 dB, ..."
+    volume = output.split("%")[0].split(" ")[-1]
+    return int(volume) if volume.isdigit() else None
+
+def parse_metadata(output):
+    ## Fill a mediaMetadata record from output of metadata_command
+    record = mediaMetadata()
+    for entry in output.split(RECORD_SEPARATOR):
+        ## playerctl terminates its output with a newline
+        entry = entry.lstrip("\n")
+        if not entry:
+            continue
+        field, separator, value = entry.partition(FIELD_SEPARATOR)
+        if not separator or field not in mediaMetadata.__dataclass_fields__:
+            raise ValueError(f"Malformed metadata record: {entry!r}")
+
+        if field == "volume":
+            value = parse_volume(value)
+        elif field == "shuffle":
+            value = value.strip() == "On"
+        elif field in ["status", "loop"]:
+            value = value.strip().lower()
+        elif field in ["length", "position"]:
+            ## MPRIS reports microseconds; an unknown length is 0, an unknown position None
+            value = int(value.strip()) / 1000000 if value.strip().isdigit() else 0.0 if field == "length" else None
+        setattr(record, field, value)
+    return record
+
+def parse_cmus_status(lines):
+    ## Fill a mediaMetadata record from the response to cmus' status command
+    record, settings, track = mediaMetadata(status=""), {}, ""
+    for line in lines:
+        key, _, value = line.partition(" ")
+        if key == "status":
+            record.status = value
+        elif key == "file":
+            track = value
+        elif key in ["position", "duration"] and value.lstrip("-").isdigit():
+            ## Whole seconds; duration is -1 for streams
+            setattr(record, "position" if key == "position" else "length", float(max(int(value), 0)))
+        elif key == "tag":
+            tag, _, value = value.partition(" ")
+            if tag in ["title", "artist", "album"]:
+                setattr(record, tag, value)
+        elif key == "set":
+            setting, _, value = value.partition(" ")
+            settings[setting] = value
+
+    ## Untagged files are named after their path
+    if track:
+        record.title = record.title or os.path.basename(track)
+        record.artist, record.album = record.artist or "", record.album or ""
+    if "vol_left" in settings and "vol_right" in settings:
+        record.volume = (int(settings["vol_left"]) + int(settings["vol_right"])) // 2
+    if "repeat" in settings:
+        record.loop = "track" if settings.get("repeat_current") == "true" else "playlist" if settings["repeat"] == "true" else "none"
+    if "shuffle" in settings:
+        ## Newer cmus reports shuffle as off/tracks/albums
+        record.shuffle = settings["shuffle"] not in ["false", "off"]
+    return record
+
+def parse_cmus_library(lines):
+    ## Yield tracks from cmus' extended save format (save -e), one file line per track
+    track = None
+    for line in lines:
+        key, _, value = line.partition(" ")
+        if key == "file":
+            if track:
+                yield track
+            track = {"locator": value, "title": os.path.basename(value), "artist": "", "album": "", "length": 0}
+        elif not track:
+            continue
+        elif key == "duration" and value.lstrip("-").isdigit():
+            track["length"] = max(int(value), 0)
+        elif key == "tag":
+            tag, _, value = value.partition(" ")
+            if tag in ["title", "artist", "album"] and value:
+                track[tag] = value
+    if track:
+        yield track
+
+def search_text(track):
+    return f"{track[0]} {track[1]} {track[2]}".lower()
+
+def trigrams(text):
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+def search_grams(text):
+    ## Trigrams for substring matches, plus " a"/" ab" word prefixes for short words
+    words = text.split()
+    return trigrams(text) | {f" {word[:length]}" for word in words for length in [1, 2]}
+
+def query_narrows(previous, query):
+    ## True if every match of query is also a match of previous: each earlier word must still start
+    ## its word, and stay on the same side of the 3 character boundary, as "ab" matches word starts
+    ## only while "abc" matches anywhere
+    previous, words = previous.lower().split(), query.lower().split()
+    return bool(previous) and len(words) >= len(previous) and all(
+        word.startswith(before) and (len(word) >= 3) == (len(before) >= 3) for before, word in zip(previous, words))
+
+def host_key(user, host, port):
+    ## IPv6 literals are bracketed, so the key parses back with parse_remote_address;
+    ## cmus hosts have no user, and are keyed host:port
+    address = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+    return f"{user}@{address}" if user else address
+
+def parse_remote_address(address):
+    ## Split user@host:port, user@[v6]:port or user@host into its parts; port is None if omitted,
+    ## and so is user (cmus hosts have none)
+    user, separator, remainder = address.rpartition("@")
+    if (separator and not user) or not remainder:
+        raise ValueError(f"Invalid address {address!r}, expected [user@]host:port")
+    if remainder.startswith("["):
+        host, _, port = remainder[1:].partition("]")
+        port = port[1:] if port.startswith(":") else port
+    elif remainder.count(":") == 1:
+        host, port = remainder.split(":")
+    else:
+        ## Bare hostname, IPv4, or IPv6 without brackets (and so without a port)
+        host, port = remainder, ""
+    if port and not port.isdigit():
+        raise ValueError(f"Invalid port {port!r} in {address!r}")
+    return user or None, host, port or None
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host.split("%")[0])
+        return True
+    except ValueError:
+        return False
+
+def lock_name(key):
+    ## File name safe for user@host:port keys of hostnames, IPv4 and IPv6 (including zone ids such as fe80::1%eth0)
+    return re.sub(r"[^a-z0-9_-]", "_", key.lower().replace(".", "-"))
+
+def interleave_families(addresses):
+    ## Alternate address families, starting with the resolver's preference (RFC 8305)
+    families = {}
+    for family, address in addresses:
+        families.setdefault(family, []).append((family, address))
+    ordered, groups = [], list(families.values())
+    for index in range(max(len(group) for group in groups)):
+        ordered += [group[index] for group in groups if index < len(group)]
+    return ordered
+
+def connect_racing(addresses, timeout, delay=CONNECT_ATTEMPT_DELAY):
+    ## Start an attempt per address, each delay seconds after the last (or as soon as it fails),
+    ## returning the first socket to connect; late winners are closed in the background
+    results = queue.Queue()
+
+    def attempt(family, address):
+        connection = socket.socket(family, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        try:
+            connection.connect(address)
+            results.put((connection, None))
+        except OSError as e:
+            connection.close()
+            results.put((None, e))
+
+    deadline, started, pending, errors, winner = time.monotonic() + timeout, 0, 0, [], None
+    while winner is None and time.monotonic() < deadline:
+        if started < len(addresses):
+            threading.Thread(target=attempt, args=addresses[started], daemon=True).start()
+            started, pending = started + 1, pending + 1
+        elif not pending:
+            break
+        remaining = max(deadline - time.monotonic(), 0)
+        try:
+            winner, error = results.get(timeout=min(delay, remaining) if started < len(addresses) else remaining)
+        except queue.Empty:
+            continue
+        pending -= 1
+        if error:
+            errors.append(error)
+
+    def close_losers(count):
+        for _ in range(count):
+            loser, error = results.get()
+            if loser:
+                loser.close()
+    if pending:
+        threading.Thread(target=close_losers, args=(pending,), daemon=True).start()
+
+    if winner is None:
+        raise errors[-1] if errors else socket.timeout(f"Timed out connecting to {len(addresses)} address(es)")
+    return winner
+
+def default_cache_dir():
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "remote-media-controller", "art")
+
 def load_params(vals):
     ## Build dictionary of parameters
     parameters={}
@@ -378,13 +2100,16 @@ def load_params(vals):
     ## Presume regular SSH Port
     parameters['remotePort'] = 22
 
+    ## Options which take no value
+    switches = ["--follow", "-f", "--daemon", "-d", "--profile-startup", "--stats"]
+
     for i, val in enumerate(vals):
         ## Mode for command execution
         if val in ["--mode", "-m"]:
             parameters['mode'] = vals[i+1]
-        ## IP address of host playing media
+        ## Hostname, IPv4 or IPv6 address of host playing media
         elif val in ["--ip", "-h"]:
-            parameters['remoteHost'] = vals[i+1]
+            parameters['remoteHost'] = vals[i+1].strip("[]")
         ## Port for CMUS or SSH connections
         elif val in ["--port", "-P"]:
             parameters['remotePort'] = vals[i+1]
@@ -397,9 +2122,39 @@ def load_params(vals):
         ## SSH Keyfile for session
         elif val in ["--keyfile", "-k"]:
             parameters['ssh_keyfile'] = vals[i+1]
+        ## Keep a persistent playerctl stream open instead of polling
+        elif val in ["--follow", "-f"]:
+            parameters['follow'] = True
+        ## Run headless, serving "main.py ctl" over a UNIX socket
+        elif val in ["--daemon", "-d"]:
+            parameters['daemon'] = True
+        elif val in ["--socket", "-s"]:
+            parameters['socket'] = vals[i+1]
+        ## Report time to window and to first metadata
+        elif val == "--profile-startup":
+            parameters['profile_startup'] = True
+        ## Show latency percentiles in the window, and/or append every sample to a file
+        elif val == "--stats":
+            parameters['stats'] = True
+        elif val == "--trace":
+            parameters['trace'] = vals[i+1]
+        ## Additional hosts kept connected alongside --ip, e.g. user@host:22,user@host2:22
+        elif val in ["--hosts", "-H"]:
+            parameters['hosts'] = [parse_remote_address(address) for address in vals[i+1].split(",")]
+        ## Directory and size cap (in MB) of the album art cache
+        elif val in ["--cache-dir", "-c"]:
+            parameters['cache_dir'] = vals[i+1]
+        elif val in ["--cache-size", "-C"]:
+            parameters['cache_size'] = int(vals[i+1])
+        ## SSH transport profile, see TRANSPORT_PROFILES
+        elif val in ["--link", "-l"]:
+            if vals[i+1] not in TRANSPORT_PROFILES:
+                usage()
+                exit(1)
+            parameters['link'] = vals[i+1]
 
-        ## Prevent checks on parameter values
-        if val.startswith("-"):
+        ## Prevent checks on parameter values (switches carry no value)
+        if val.startswith("-") and val not in switches:
             del vals[i+1]
     if len(parameters) == 0:
         usage()
@@ -412,23 +2167,37 @@ def usage():
     print("e.g.")
     print(f"    {sys.argv[0]} --mode ssh --ip 192.168.0.2 --port 22 --user user")
     print("Options:")
-    print(f"    -m, --mode      [e.g. ssh]")
-    print(f"    -h, --ip        [e.g. 192.168.0.2]")
+    print(f"    -m, --mode      [ssh, playerctl, agent or cmus]")
+    print(f"    -h, --ip        [e.g. 192.168.0.2, fe80::1 or media.lan]")
     print(f"    -P, --port      [e.g. 22]")
     print(f"    -u, --user      [e.g. user]")
     print(f"    -p, --password  [e.g. password]")
     print(f"    -k, --keyfile   [e.g. id_rsa]")
+    print(f"    -f, --follow    [push updates from playerctl, SSH only]")
+    print(f"    -H, --hosts     [e.g. user@192.168.0.3:22,user@[fe80::2]:22,user@media.lan]")
+    print(f"    -d, --daemon    [run headless, controlled through {sys.argv[0]} ctl]")
+    print(f"    -s, --socket    [e.g. /run/user/1000/remote-media-controller.sock]")
+    print(f"    -c, --cache-dir [e.g. ~/.cache/remote-media-controller/art]")
+    print(f"    -C, --cache-size [MB, e.g. 64]")
+    print(f"    -l, --link      [lan, wan or lowpower SSH transport tuning]")
+    print(f"    --profile-startup [print time to window and to first metadata]")
+    print(f"    --stats         [show per-command latency percentiles in the window]")
+    print(f"    --trace         [append latency samples as JSON lines, e.g. trace.jsonl]")
+    print("Control a running daemon:")
+    print(f"    {sys.argv[0]} ctl [--socket <path>] [--all] [--json] <command> [<value>]")
+    print(f"    commands: {', '.join(CTL_COMMANDS)}")
 
 def main(version):
     try:
         parameters = load_params(sys.argv)
-        controllerInstance = controller(parameters, version)
-        controllerInstance.__session__.close()
+        ## Windowed startup imports paramiko behind the window, see __openWindow__
+        load_modules(gui=not parameters.get("daemon", False), ssh=parameters.get("daemon", False))
+        controller(parameters, version)
     except IndexError:
         print("Missing required parameters!")
         usage()
-    except FileExistsError:
-        print("Issue obtaining file lock. Is remote-media-controller already running?")
+    except FileExistsError as e:
+        print(f"{e}. Is remote-media-controller already running?")
     except ValueError:
         print("Error loading values from media player. Is nothing playing?")
         exit()
@@ -437,7 +2206,7 @@ def main(version):
         print(e)
 
 if __name__ == "__main__":
-    ## Load version information
-    with open("./version.txt") as version_file:
+    ## Load version information, found next to this script rather than in the working directory
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "version.txt")) as version_file:
         version = version_file.read()
     main(version)
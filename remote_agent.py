@@ -0,0 +1,255 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2023 le-firehawk
+
+# remote-media-controller is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# remote-media-controller is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# To contact the owner of remote-media-controller, use the following:
+# Email: firehawk@opayq.net
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/agpl-3.0.html>
+
+## Helper uploaded and started by remote-media-controller in agent mode.
+## Requests are read from stdin, responses and events written to stdout,
+## one JSON object per line:
+##     -> {"id": 1, "command": "seek", "value": -5}
+##     <- {"id": 1, "result": {...}}
+##     <- {"id": 2, "chunk": [...]}, ahead of the result of streamed requests
+##     <- {"event": "state", "result": {...}}
+## MPRIS is reached over D-Bus through GLib (python3-gi), PulseAudio through
+## pulsectl where installed, otherwise a single long-lived pactl subscriber
+
+import json, os, sys, threading, subprocess
+
+## Reported to the controller as fatal, so it stops reconnecting to a host which lacks python3-gi
+try:
+    from gi.repository import Gio, GLib
+except ImportError:
+    print(json.dumps({"fatal": "python3-gi is not installed on the remote host"}), flush=True)
+    sys.exit(1)
+
+try:
+    import pulsectl
+except ImportError:
+    pulsectl = None
+
+## playerctl does the same when no session bus address is exported
+if "DBUS_SESSION_BUS_ADDRESS" not in os.environ:
+    os.environ["DBUS_SESSION_BUS_ADDRESS"] = f"unix:path=/run/user/{os.getuid()}/bus"
+
+MPRIS_PREFIX, MPRIS_PATH = "org.mpris.MediaPlayer2.", "/org/mpris/MediaPlayer2"
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+TRACKLIST_INTERFACE = "org.mpris.MediaPlayer2.TrackList"
+
+## Tracks whose metadata is fetched and sent per chunk of a tracklist request
+TRACKLIST_CHUNK = 500
+
+class mprisAgent:
+    def __init__(self):
+        self.__bus__ = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+        self.__player__, self.__volume__ = None, None
+        self.__output_lock__ = threading.Lock()
+        if pulsectl:
+            self.__pulse__ = pulsectl.Pulse("remote-media-controller-agent")
+            self.__pulse_lock__ = threading.Lock()
+
+        ## Follow players appearing and disappearing on the bus
+        self.__bus__.signal_subscribe("org.freedesktop.DBus", "org.freedesktop.DBus", "NameOwnerChanged",
+            "/org/freedesktop/DBus", None, Gio.DBusSignalFlags.NONE, self.__nameOwnerChanged__)
+        self.__selectPlayer__()
+
+        threading.Thread(target=self.__watchVolume__, daemon=True).start()
+        threading.Thread(target=self.__readRequests__, daemon=True).start()
+
+    def __write__(self, message):
+        with self.__output_lock__:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    def __selectPlayer__(self):
+        names = self.__bus__.call_sync("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+            "ListNames", None, None, Gio.DBusCallFlags.NONE, -1, None).unpack()[0]
+        players = sorted(name for name in names if name.startswith(MPRIS_PREFIX))
+        self.__player__ = None
+        for name in players:
+            player = Gio.DBusProxy.new_sync(self.__bus__, Gio.DBusProxyFlags.NONE, None, name, MPRIS_PATH, PLAYER_INTERFACE, None)
+            ## Prefer whichever player is currently playing, as playerctl does
+            if not self.__player__ or self.__property__(player, "PlaybackStatus") == "Playing":
+                self.__player__ = player
+        if self.__player__:
+            self.__player__.connect("g-properties-changed", lambda *args: self.__pushState__())
+            ## Position is not a signalled property, jumps are announced by Seeked instead
+            self.__player__.connect("g-signal", lambda proxy, sender, signal, parameters: signal == "Seeked" and self.__pushState__())
+
+    def __nameOwnerChanged__(self, connection, sender, path, interface, signal, parameters):
+        if parameters.unpack()[0].startswith(MPRIS_PREFIX):
+            self.__selectPlayer__()
+            self.__pushState__()
+
+    def __property__(self, player, name, default=None):
+        value = player.get_cached_property(name)
+        return value.unpack() if value is not None else default
+
+    def __getPosition__(self):
+        ## Never cached by the proxy, so fetched on each call; players without a position
+        ## (streams, or ones that just quit) answer with an error, reported as None
+        try:
+            return self.__bus__.call_sync(self.__player__.get_name(), MPRIS_PATH, "org.freedesktop.DBus.Properties", "Get",
+                GLib.Variant("(ss)", (PLAYER_INTERFACE, "Position")), None, Gio.DBusCallFlags.NONE, -1, None).unpack()[0]
+        except GLib.Error:
+            return None
+
+    def __setProperty__(self, name, value):
+        self.__bus__.call_sync(self.__player__.get_name(), MPRIS_PATH, "org.freedesktop.DBus.Properties", "Set",
+            GLib.Variant("(ssv)", (PLAYER_INTERFACE, name, value)), None, Gio.DBusCallFlags.NONE, -1, None)
+
+    def __callPlayer__(self, method, parameters=None):
+        self.__player__.call_sync(method, parameters, Gio.DBusCallFlags.NONE, -1, None)
+
+    def __callTrackList__(self, method, parameters, interface=TRACKLIST_INTERFACE):
+        ## Only some players implement the optional TrackList interface
+        return self.__bus__.call_sync(self.__player__.get_name(), MPRIS_PATH, interface, method,
+            parameters, None, Gio.DBusCallFlags.NONE, -1, None).unpack()
+
+    def __streamTracks__(self, request_id, tracks, offset):
+        try:
+            chunk = self.__callTrackList__("GetTracksMetadata", GLib.Variant("(ao)", (tracks[offset:offset + TRACKLIST_CHUNK],)))[0]
+            self.__write__({"id": request_id, "chunk": [{
+                "locator": metadata.get("mpris:trackid", ""),
+                "title": metadata.get("xesam:title", ""),
+                "artist": ", ".join(metadata.get("xesam:artist", [])),
+                "album": metadata.get("xesam:album", ""),
+                "length": metadata.get("mpris:length", 0) // 1000000
+            } for metadata in chunk]})
+            if offset + TRACKLIST_CHUNK < len(tracks):
+                GLib.idle_add(self.__streamTracks__, request_id, tracks, offset + TRACKLIST_CHUNK)
+            else:
+                self.__write__({"id": request_id, "result": {"count": len(tracks)}})
+        except Exception as e:
+            self.__write__({"id": request_id, "error": str(e)})
+        return False
+
+    def __getVolume__(self):
+        if pulsectl:
+            with self.__pulse_lock__:
+                sink = self.__pulse__.get_sink_by_name(self.__pulse__.server_info().default_sink_name)
+                return round(self.__pulse__.volume_get_all_chans(sink) * 100)
+        if self.__volume__ is None:
+            output = subprocess.run(["pactl", "get-sink-volume", "@DEFAULT_SINK@"], capture_output=True, text=True).stdout
+            volume = output.split("%")[0].split(" ")[-1]
+            self.__volume__ = int(volume) if volume.isdigit() else None
+        return self.__volume__
+
+    def __setVolume__(self, volume):
+        if pulsectl:
+            with self.__pulse_lock__:
+                sink = self.__pulse__.get_sink_by_name(self.__pulse__.server_info().default_sink_name)
+                self.__pulse__.volume_set_all_chans(sink, volume / 100)
+        else:
+            subprocess.run(["pactl", "set-sink-volume", "@DEFAULT_SINK@", f"{volume}%"])
+            self.__volume__ = volume
+
+    def __watchVolume__(self):
+        ## Sink changes are pushed as state events
+        if pulsectl:
+            with pulsectl.Pulse("remote-media-controller-events") as events:
+                events.event_mask_set("sink")
+                events.event_callback_set(lambda event: GLib.idle_add(self.__volumeChanged__))
+                events.event_listen()
+        else:
+            subscriber = subprocess.Popen(["pactl", "subscribe"], stdout=subprocess.PIPE, text=True)
+            for line in subscriber.stdout:
+                if " on sink " in line:
+                    GLib.idle_add(self.__volumeChanged__)
+
+    def __volumeChanged__(self):
+        self.__volume__ = None
+        self.__pushState__()
+        return False
+
+    def state(self):
+        ## Mirrors the fields of mediaMetadata in the controller
+        if not self.__player__:
+            return {"status": "", "volume": self.__getVolume__()}
+        metadata, position = self.__property__(self.__player__, "Metadata", {}), self.__getPosition__()
+        artist = metadata.get("xesam:artist", [])
+        return {
+            "title": metadata.get("xesam:title", ""),
+            "artist": ", ".join(artist) if isinstance(artist, list) else artist,
+            "album": metadata.get("xesam:album", ""),
+            "art_url": metadata.get("mpris:artUrl", ""),
+            "status": self.__property__(self.__player__, "PlaybackStatus", "").lower(),
+            "volume": self.__getVolume__(),
+            "loop": self.__property__(self.__player__, "LoopStatus", "None").lower(),
+            "shuffle": self.__property__(self.__player__, "Shuffle", False),
+            ## MPRIS times are in microseconds, the controller works in seconds
+            "position": None if position is None else position / 1000000,
+            "length": metadata.get("mpris:length", 0) / 1000000,
+            "rate": self.__property__(self.__player__, "Rate", 1.0)
+        }
+
+    def __pushState__(self):
+        self.__write__({"event": "state", "result": self.state()})
+
+    def __handle__(self, request):
+        command, value = request.get("command"), request.get("value")
+        try:
+            if command != "state" and not self.__player__:
+                raise RuntimeError("No players found")
+            if command == "play_pause":
+                self.__callPlayer__("PlayPause")
+            elif command == "pause":
+                self.__callPlayer__("Pause")
+            elif command in ["next", "previous"]:
+                for _ in range(value or 1):
+                    self.__callPlayer__(command.capitalize())
+            elif command == "seek":
+                ## MPRIS offsets are in microseconds
+                self.__callPlayer__("Seek", GLib.Variant("(x)", (int(value) * 1000000,)))
+            elif command == "position":
+                trackid = self.__property__(self.__player__, "Metadata", {}).get("mpris:trackid", "/org/mpris/MediaPlayer2/TrackList/NoTrack")
+                self.__callPlayer__("SetPosition", GLib.Variant("(ox)", (trackid, int(value) * 1000000)))
+            elif command == "shuffle_toggle":
+                self.__setProperty__("Shuffle", GLib.Variant("b", not self.__property__(self.__player__, "Shuffle", False)))
+            elif command == "loop":
+                self.__setProperty__("LoopStatus", GLib.Variant("s", value.capitalize()))
+            elif command == "volume":
+                self.__setVolume__(int(value))
+            elif command == "play_track":
+                self.__callTrackList__("GoTo", GLib.Variant("(o)", (value,)))
+            elif command == "tracklist":
+                ## Streamed from the main loop one chunk at a time, so other requests are answered in between
+                tracks = self.__callTrackList__("Get", GLib.Variant("(ss)", (TRACKLIST_INTERFACE, "Tracks")), "org.freedesktop.DBus.Properties")[0]
+                GLib.idle_add(self.__streamTracks__, request.get("id"), tracks, 0)
+                return False
+            elif command != "state":
+                raise ValueError(f"Unknown command {command}")
+            self.__write__({"id": request.get("id"), "result": self.state()})
+        except Exception as e:
+            self.__write__({"id": request.get("id"), "error": str(e)})
+        return False
+
+    def __readRequests__(self):
+        ## D-Bus calls are made from the main loop, never from this thread
+        for line in sys.stdin:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            GLib.idle_add(self.__handle__, request)
+        ## Controller closed the channel
+        GLib.idle_add(loop.quit)
+
+if __name__ == "__main__":
+    loop = GLib.MainLoop()
+    mprisAgent()
+    loop.run()
@@ -15,6 +15,8 @@ try:
         version=version,
         packages=[],
         install_requires=["PySimpleGUI"],
+        ## Optional, scales artwork locally where the remote host lacks ImageMagick
+        extras_require={"art": ["Pillow"]},
         url="https://github.com/le-firehawk/remote-media-controller",
         license="AGPL v3",
         author="le-firehawk",
@@ -26,5 +28,5 @@ except Exception as e:
     exit()
 else:
     print("Installation successful!")
-    print("If running in CMUS mode, the cmus package, which ships cmus-remote utility, must be installed on both hosts")
+    print("If running in CMUS mode, cmus must be listening on the destination host (:set server=... and :set passwd=...)")
     print("If running in SSH/PlayerCTL mode, the playerctl package must be installed on the destination host, and ssh on the source host")
@@ -0,0 +1,39 @@
+import os, sys, tempfile, time, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+def write(data):
+    def writer(path):
+        with open(path, "wb") as image_file:
+            image_file.write(data)
+    return writer
+
+class artCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_only_stale_partial_files_are_removed(self):
+        ## A fresh .part may be another process's transfer in progress
+        fresh, stale = os.path.join(self.directory.name, "a.1.2.part"), os.path.join(self.directory.name, "b.1.2.part")
+        for path in [fresh, stale]:
+            open(path, "wb").close()
+        old = time.time() - main.STALE_PART_AGE - 60
+        os.utime(stale, (old, old))
+        main.artCache(self.directory.name, 1024)
+        self.assertTrue(os.path.exists(fresh))
+        self.assertFalse(os.path.exists(stale))
+
+    def test_lookup_drops_entries_evicted_elsewhere(self):
+        cache = main.artCache(self.directory.name, 1024)
+        path = cache.store(cache.key("cover"), write(b"png"))
+        self.assertEqual(cache.lookup(cache.key("cover")), path)
+        os.remove(path)
+        self.assertIsNone(cache.lookup(cache.key("cover")))
+        ## Storing again works as after any other miss
+        self.assertEqual(cache.store(cache.key("cover"), write(b"png")), path)
+        self.assertEqual(cache.lookup(cache.key("cover")), path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os, socket, sys, threading, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+class fakeCmusServer:
+    ## Answers like cmus: an empty line acknowledges passwd, every reply ends with an empty line
+    def __init__(self, password="secret"):
+        self.password, self.commands = password, []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        client, _ = self.listener.accept()
+        stream = client.makefile("rb")
+        if stream.readline().decode().strip() != f"passwd {self.password}":
+            client.sendall(b"authentication failed\n")
+            client.close()
+            return
+        client.sendall(b"\n")
+        for line in stream:
+            command = line.decode().strip()
+            self.commands.append(command)
+            reply = f"status playing\nset vol_left 40\nset vol_right 40\n" if command == "status" else f"echo {command}\n"
+            client.sendall(f"{reply}\n".encode())
+
+    def close(self):
+        self.listener.close()
+
+class cmusClientTest(unittest.TestCase):
+    def test_replies_match_their_commands(self):
+        server = fakeCmusServer()
+        client = main.cmusClient("127.0.0.1", server.port, "secret")
+        try:
+            self.assertEqual(client.command("status"), ["status playing", "set vol_left 40", "set vol_right 40"])
+            self.assertEqual(client.command("player-next"), ["echo player-next"])
+            self.assertEqual(list(client.stream("vol 20%")), ["echo vol 20%"])
+            self.assertEqual(main.parse_cmus_status(client.command("status")).volume, 40)
+            self.assertEqual(server.commands, ["status", "player-next", "vol 20%", "status"])
+        finally:
+            client.close()
+            server.close()
+
+    def test_rejected_password_raises(self):
+        server = fakeCmusServer()
+        client = main.cmusClient("127.0.0.1", server.port, "wrong")
+        try:
+            with self.assertRaisesRegex(main.hostSetupError, "rejected the password"):
+                client.command("status")
+        finally:
+            server.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import os, sys, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+def track(title, artist="Artist", album="Album"):
+    return {"title": title, "artist": artist, "album": album, "length": 0, "locator": title}
+
+class libraryIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = main.libraryIndex()
+        self.index.add([track("Abcde"), track("Xabc"), track("Abacus"), track("Other", artist="Band")])
+
+    def narrowed(self, previous, query):
+        ## What the browser shows after typing query on top of previous
+        results = self.index.search(previous)
+        return self.index.search(query, within=results if main.query_narrows(previous, query) else None)
+
+    def test_typing_matches_a_full_search(self):
+        for previous, query in [("ab", "abc"), ("abc", "abcd"), ("ab", "ab art"), ("a", "ab"), ("abc", "ab"), ("ab x", "ab")]:
+            with self.subTest(previous=previous, query=query):
+                self.assertEqual(self.narrowed(previous, query), self.index.search(query))
+
+    def test_query_narrows(self):
+        self.assertTrue(main.query_narrows("ab", "ab"))
+        self.assertTrue(main.query_narrows("abc", "abcd"))
+        self.assertTrue(main.query_narrows("ab", "ab band"))
+        self.assertFalse(main.query_narrows("ab", "abc"))
+        self.assertFalse(main.query_narrows("abc", "ab"))
+        self.assertFalse(main.query_narrows("", "abc"))
+        self.assertFalse(main.query_narrows("ab band", "ab"))
+
+if __name__ == "__main__":
+    unittest.main()